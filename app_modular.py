@@ -4,24 +4,45 @@
 """
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
+import numpy as np
 import pandas as pd
 from datetime import datetime
+import hashlib
+import io
 import logging
+import os
+
+from scheduler_core import (
+    DEFAULT_WEEKLY_LIMIT,
+    EXPORT_FORMATS,
+    XLSX_AVAILABLE,
+    auto_assign,
+    build_export_df,
+    build_missing_report,
+    ingest,
+    optimal_assign,
+    repair_assign,
+    slot_records,
+    slot_rows,
+    write_export,
+)
+from board import render_board
+from instrumentation import PhaseTimer
+from storage import (
+    EMPLOYEE_EXPORT_FIELDS,
+    SHIFT_EXPORT_FIELDS,
+    BalanceSync,
+    FirestoreStorage,
+    SQLiteStorage,
+    write_csv,
+)
+from persistence import FAILED, RETRYING, SAVED, PersistenceWorker
 
 # הגדרות לוגים
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# קבועים
-REQUIRED_REQUEST_COLUMNS = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה']
-REQUIRED_SHIFT_COLUMNS = ['משמרת', 'תחנה', 'סוג תקן']  # סדר מדויק כמו בקובץ
-OPTIONAL_SHIFT_COLUMNS = ['שעות', 'תפקיד']  # עמודות אופציונליות
-DAYS_HEB = {
-    'Sunday': 'ראשון', 'Monday': 'שני', 'Tuesday': 'שלישי',
-    'Wednesday': 'רביעי', 'Thursday': 'חמישי', 'Friday': 'שישי', 'Saturday': 'שבת'
-}
-DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y']
-
 # Firebase - אופציונלי
 try:
     import firebase_admin
@@ -307,86 +328,38 @@ if FIREBASE_AVAILABLE:
     except Exception as e:
         logger.error(f"Firebase initialization failed: {e}")
 
-# Helper Functions
-def parse_date_safe(date_str):
-    """המרת תאריך מחוזקת"""
-    for fmt in DATE_FORMATS:
-        try:
-            return pd.to_datetime(date_str, format=fmt)
-        except:
-            continue
+# אחסון - Firestore אם מחובר, אחרת SQLite מקומי אם הוגדר נתיב
+store = None
+if db:
+    store = FirestoreStorage(db)
+elif os.environ.get('SCHEDULER_SQLITE_PATH'):
     try:
-        return pd.to_datetime(date_str)
-    except:
-        return None
+        store = SQLiteStorage(os.environ['SCHEDULER_SQLITE_PATH'])
+        logger.info("SQLite storage ready")
+    except Exception as e:
+        logger.error(f"SQLite initialization failed: {e}")
 
-def get_day_name(date_str):
-    """קבלת שם יום בעברית"""
-    try:
-        return DAYS_HEB.get(parse_date_safe(date_str).strftime('%A'), "")
-    except:
-        return ""
+# מאזן מ-Database בזיכרון לכל התהליך - שינויים נמשכים לכל היותר פעם ב-X שניות או מיד אחרי שמירה
+BALANCE_SYNC_INTERVAL = float(os.environ.get('BALANCE_SYNC_INTERVAL', 30))  # שניות
 
-def get_week_start(date_str):
-    """מחזיר תאריך ראשון של השבוע"""
-    try:
-        dt = parse_date_safe(date_str)
-        if dt:
-            days_since_sunday = (dt.weekday() + 1) % 7
-            sunday = dt - pd.Timedelta(days=days_since_sunday)
-            return sunday.strftime('%Y-%m-%d')
-    except:
-        pass
-    return date_str
-
-def validate_dataframes(req_df, shi_df):
-    """בדיקת תקינות קבצים - רק בדיקת קיום עמודות, לא סדר"""
-    errors = []
-    
-    # בדיקת קובץ בקשות - רק שהעמודות קיימות
-    missing_req = set(REQUIRED_REQUEST_COLUMNS) - set(req_df.columns)
-    if missing_req:
-        errors.append(f"❌ עמודות חסרות בקובץ בקשות: {', '.join(missing_req)}")
-    
-    # בדיקת קובץ משמרות - רק שהעמודות קיימות
-    missing_shi = set(REQUIRED_SHIFT_COLUMNS) - set(shi_df.columns)
-    if missing_shi:
-        errors.append(f"❌ עמודות חסרות בתבנית משמרות: {', '.join(missing_shi)}")
-    
-    return errors
+# Helper Functions
+@st.cache_resource(show_spinner=False)
+def get_balance_sync():
+    """מאזן מצטבר מ-Database (שם -> total_shifts), משותף לכל הסשנים
 
-def get_atan_column(df):
-    """מציאת עמודת אט"ן - תומך בשמות שונים"""
-    # רשימת שמות אפשריים
-    possible_names = ['אטן', 'אט"ן', 'אט״ן', 'אטען', 'atan', 'מורשה']
-    
-    for col in df.columns:
-        col_lower = col.lower().strip()
-        # בדוק אם יש התאמה חלקית
-        if any(name in col_lower for name in possible_names):
-            return col
-        # בדוק אם יש אט בעמודה
-        if 'אט' in col:
-            return col
-    
-    return None
+    טעינה מלאה פעם אחת, ואחר כך רק עובדים שעודכנו מאז (updated_at).
+    כל סשן מקבל עותק, כך שאף סשן לא משנה את המפה המשותפת.
+    """
+    return BalanceSync(store, interval=BALANCE_SYNC_INTERVAL)
 
 def get_balance():
     """חישוב מאזן משמרות - כולל Database אם קיים"""
     balance = {}
     
-    # קרא מאזן מצטבר מ-Database אם זמין
-    if db:
+    # מאזן מצטבר מ-Database (מהזיכרון + שינויים מאז הסנכרון האחרון)
+    if store:
         try:
-            employees_ref = db.collection('employees')
-            docs = employees_ref.stream()
-            for doc in docs:
-                data = doc.to_dict()
-                employee_name = data.get('name', '')
-                total_shifts = data.get('total_shifts', 0)
-                if employee_name:
-                    balance[employee_name] = total_shifts
-            logger.info(f"✅ נטען מאזן מ-Database: {len(balance)} עובדים")
+            balance = get_balance_sync().snapshot()
         except Exception as e:
             logger.warning(f"⚠️ לא הצלחתי לקרוא מ-Database: {e}")
     
@@ -396,116 +369,232 @@ def get_balance():
     
     return balance
 
-def auto_assign(dates, shi_df, req_df, balance):
-    """שיבוץ אוטומטי עם כללים מתקדמים"""
-    temp_schedule, temp_assigned = {}, {d: set() for d in dates}
-    running_balance = balance.copy()
-    atan_col = get_atan_column(req_df)
+def load_uploads(req_file, shi_file):
+    """קליטה ונרמול - נשמרים בסשן לפי hash של תוכן הקבצים
+
+    ריצה חוזרת עם אותם קבצים מקבלת את אותן טבלאות ותיקונים בלי לקרוא מחדש.
+    """
+    req_bytes, shi_bytes = req_file.getvalue(), shi_file.getvalue()
+    key = (
+        hashlib.blake2b(req_bytes, digest_size=16).hexdigest(),
+        hashlib.blake2b(shi_bytes, digest_size=16).hexdigest(),
+    )
+    cached = st.session_state.get('ingest_cache')
+    if cached is None or cached[0] != key:
+        cached = (key, ingest(io.BytesIO(req_bytes), io.BytesIO(shi_bytes)))
+        st.session_state.ingest_cache = cached
+    return cached[1]
+
+def export_csv(records, fields, label):
+    """ייצוא רשומות מהאחסון ל-CSV, עם התקדמות - מחזיר (bytes, מספר שורות)
+
+    הרשומות נכתבות ישר לקובץ בלי רשימה / DataFrame ביניים.
+    """
+    progress = st.empty()
+    buffer = io.BytesIO()
+    out = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+    rows = write_csv(records, fields, out,
+                     on_progress=lambda n: progress.caption(f"⏳ נקראו {n} {label}..."))
+    out.flush()
+    progress.empty()
+    return buffer.getvalue(), rows
+
+@st.cache_resource(show_spinner=False)
+def get_persistence_worker():
+    """thread שמירה אחד לכל התהליך; אחרי שמירה מוצלחת המאזן נקרא מחדש"""
+    return PersistenceWorker(store, on_saved=lambda job: get_balance_sync().invalidate())
+
+def submit_save():
+    """שיבוץ, ביטולים ופרטי כל משבצות האופק לתור השמירה - מחזיר טוקן גרסה
     
-    # עקוב אחר שיבוצים שבועיים
-    weekly_assignments = {}
+    גם משבצות ריקות נשלחות - מסמך ישן שלהן ב-shifts נמחק באותה שמירה.
+    """
+    schedule, cancelled = st.session_state.final_schedule, st.session_state.cancelled_shifts
+    cached = st.session_state.get('ingest_cache')
+    slot_info = {}
+    if cached and cached[1]['slots'] is not None:
+        slots = cached[1]['slots']
+        slot_info = dict(zip(slots['key'], slot_records(slots, ['date', 'date_iso', 'station', 'shift', 'row'])))
+    return get_persistence_worker().submit(schedule, cancelled, slot_info)
+
+def show_save_status(job):
+    """מצב השמירה האחרונה של הסשן"""
+    if job['state'] == SAVED:
+        written = job['written']
+        st.success(f"✅ עודכנו {len(written)} עובדים ב-Database!")
+        with st.expander("📊 פירוט עדכון"):
+            for employee, (shifts, total) in sorted(written.items(), key=lambda x: x[1][0], reverse=True):
+                st.write(f"**{employee}**: {shifts} חדשות → סה\"כ {total} משמרות")
+    elif job['state'] == FAILED:
+        st.error(f"❌ השמירה נכשלה אחרי {job['attempts']} ניסיונות: {job['error']}")
+        if st.button("🔁 נסה שוב", width="stretch"):
+            st.session_state.save_token = submit_save()
+            st.rerun()
+    elif job['state'] == RETRYING:
+        st.warning(f"🔁 ניסיון {job['attempts']} נכשל, מנסה שוב... ({job['error']})")
+    else:
+        st.info(f"⏳ שומר ברקע {job['shifts']} משמרות...")
+
+def watch_save_status():
+    """מתעדכן כל שנייה עד שהשמירה מסתיימת, ואז מרענן את כל הדף (מאזן חדש)"""
+    job = get_persistence_worker().status(st.session_state.save_token)
+    if job['state'] in (SAVED, FAILED):
+        st.rerun()
+    show_save_status(job)
+
+def select_board_week(weeks):
+    """בורר שבוע ללוח - מחזיר את מפתח השבוע הנבחר"""
+    week_keys = list(weeks)
+    if not week_keys:
+        return None
+    if st.session_state.get('board_week') not in weeks:
+        st.session_state.board_week = week_keys[0]
+    if len(week_keys) > 1:
+        st.radio(
+            "שבוע", week_keys, key='board_week', horizontal=True,
+            format_func=lambda week: f"{weeks[week][0]} - {weeks[week][-1]}",
+        )
+    return st.session_state.board_week
+
+def handle_board_event(action, slot_id, inputs, balance):
+    """פעולה מהלוח: שיבוץ (דיאלוג), מחיקה, ביטול או שחזור של משבצת"""
+    slot = inputs['slots'].loc[slot_id]
+    shift_key, date_str = slot['key'], slot['date']
+    missing_before = count_missing(inputs)
     
-    def get_week_key(date_str):
-        """מחזיר מפתח שבוע"""
-        try:
-            date_obj = parse_date_safe(date_str)
-            if date_obj:
-                days_since_sunday = (date_obj.weekday() + 1) % 7
-                sunday = date_obj - pd.Timedelta(days=days_since_sunday)
-                return sunday.strftime('%Y-%m-%d')
-        except:
-            pass
-        return date_str
+    if action == 'assign':
+        if shift_key not in st.session_state.final_schedule:
+            show_assignment_dialog(slot, build_dialog_candidates(slot, inputs, balance))
+        return
     
-    def get_hours_from_request(row):
-        """מחלץ שעות מבקשה"""
-        time_cols = [c for c in req_df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower() or 'time' in c.lower()]
-        if time_cols:
-            hours_val = row[time_cols[0]] if time_cols[0] in row.index else None
-            if pd.notna(hours_val):
-                hours_str = str(hours_val).strip().replace(' ', '')
-                return hours_str
-        return None
+    if action == 'restore':
+        st.session_state.cancelled_shifts.discard(shift_key)
+        apply_repair(date_str, inputs, balance)
     
-    def get_hours_from_shift(shift_row):
-        """מחלץ שעות ממשמרת"""
-        time_cols = [c for c in shi_df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower() or 'time' in c.lower()]
-        if time_cols:
-            hours_val = shift_row[time_cols[0]] if time_cols[0] in shift_row.index else None
-            if pd.notna(hours_val):
-                hours_str = str(hours_val).strip().replace(' ', '')
-                return hours_str
-        return None
+    elif action in ('delete', 'cancel'):
+        employee = st.session_state.final_schedule.pop(shift_key, None)
+        if action == 'cancel':
+            st.session_state.cancelled_shifts.add(shift_key)
+        if employee is not None:
+            if date_str in st.session_state.assigned_today:
+                st.session_state.assigned_today[date_str].discard(employee)
+            balance[employee] = balance.get(employee, 1) - 1
+            exclude = {(shift_key, employee)} if action == 'delete' else ()
+            apply_repair(date_str, inputs, balance, exclude=exclude)
+    bump_schedule_version()
     
-    # מכסה שבועית
-    WEEKLY_LIMIT = st.session_state.get('weekly_shift_limit', 5)
+    # כשהעריכה משנה גם את מונה החוסרים, דוח פתוח או תצוגת ייצוא פתוחה -
+    # ריצה מלאה (הקליטה, המאזן וקבצי הייצוא שמורים במטמון). אחרת רק הלוח
+    # והמדדים מתעדכנים. אירוע שהגיע בריצה מלאה (לא מתוך הקטע) מקבל ריצה מלאה
+    if (count_missing(inputs) != missing_before or not st.session_state.final_schedule
+            or st.session_state.get('show_missing_report') or st.session_state.get('show_export_preview')):
+        st.rerun()
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def count_missing(inputs):
+    """משמרות חסרות - סך המשבצות פחות משובצות ומבוטלות"""
+    total_shifts = len(inputs['shi_df']) * len(inputs['dates'])
+    return total_shifts - len(st.session_state.final_schedule) - len(st.session_state.cancelled_shifts)
+
+def bump_schedule_version():
+    """גרסת השיבוץ עולה בכל עריכה - ומטמון הייצוא של הגרסה הקודמת מתרוקן
+
+    המטמון מתרוקן במקום (clear) ולא מוחלף, כי כפתורי ההורדה של קטע הייצוא
+    מחזיקים אותו עד הריצה הבאה של הקטע - עריכה בלוח לא מריצה אותו מחדש.
+    """
+    st.session_state.schedule_version = st.session_state.get('schedule_version', 0) + 1
+    st.session_state.get('export_cache', {}).clear()
+
+def get_export_cache(inputs, balance):
+    """מטמון קבצי הייצוא לגרסת השיבוץ, הקבצים שהועלו והמאזן הנוכחיים"""
+    key = (
+        st.session_state.ingest_cache[0],
+        st.session_state.get('schedule_version', 0),
+        hash(frozenset(balance.items())),
+    )
+    cache = st.session_state.get('export_cache')
+    if cache is None:
+        cache = st.session_state.export_cache = {}
+    if cache.get('key') != key:
+        cache.clear()
+        cache['key'] = key
+    return cache
+
+def get_engine_settings():
+    """הגדרות השיבוץ מהסשן - כפרמטרים למנוע"""
+    return {
+        'weekly_limit': st.session_state.get('weekly_shift_limit', DEFAULT_WEEKLY_LIMIT),
+        'strict_hours': st.session_state.get('strict_hours_matching', True),
+        'cancelled': st.session_state.cancelled_shifts,
+    }
+
+def apply_repair(date_str, inputs, balance, exclude=()):
+    """הרצת השלמה מקומית ועדכון השיבוץ והמאזן בסשן (אם מופעל)
+
+    balance הוא המאזן שהקטעים מקבלים מהריצה המלאה האחרונה - עדכון במקום
+    שומר אותו נכון לשיבוצים הבאים, לדיאלוג ולייצוא עד הריצה המלאה הבאה.
+    """
+    if not st.session_state.get('auto_repair', True):
+        return {}
+    filled = repair_assign(
+        date_str, inputs['dates'], inputs['shi_df'], inputs['req_df'], st.session_state.final_schedule, balance,
+        exclude=exclude, slots=inputs['slots'], **get_engine_settings()
+    )
+    rows = slot_rows(inputs['slots'], filled)
+    for shift_key, filled_date in zip(rows['key'], rows['date']):
+        employee = filled[shift_key]
+        st.session_state.final_schedule[shift_key] = employee
+        st.session_state.assigned_today.setdefault(filled_date, set()).add(employee)
+        balance[employee] = balance.get(employee, 0) + 1
+    return filled
+
+def build_dialog_candidates(slot, inputs, balance):
+    """מועמדים לשיבוץ ידני במשבצת - נבנים פעם אחת כשהדיאלוג נפתח
+
+    שורות הבקשות לאותו תאריך ומשמרת נלקחות מהאינדקס שנבנה בקליטה, בלי
+    סינון של כל req_df, וכל עמודות התצוגה והתוויות לבחירה מחושבות כאן.
+    """
+    if not isinstance(st.session_state.assigned_today, dict):
+        st.session_state.assigned_today = {}
+    already_working = st.session_state.assigned_today.get(slot['date'], set())
+    req_df, station = inputs['req_df'], slot['station']
     
-    for date_str in dates:
-        week_key = get_week_key(date_str)
-        
-        for idx, shift_row in shi_df.iterrows():
-            shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-            if shift_key in st.session_state.cancelled_shifts:
-                continue
-            
-            # סינון מועמדים
-            potential = req_df[
-                (req_df['תאריך מבוקש'] == date_str) &
-                (req_df['משמרת'] == shift_row['משמרת']) &
-                (req_df['תחנה'] == shift_row['תחנה']) &
-                (~req_df['שם'].isin(temp_assigned[date_str]))
-            ].copy()
-            
-            # בדיקת שעות (אם מופעל)
-            strict_hours = st.session_state.get('strict_hours_matching', True)
-            shift_hours = get_hours_from_shift(shift_row)
-            
-            if strict_hours and shift_hours and not potential.empty:
-                matching_hours = []
-                for _, emp_row in potential.iterrows():
-                    emp_hours = get_hours_from_request(emp_row)
-                    if emp_hours and emp_hours == shift_hours:
-                        matching_hours.append(emp_row['שם'])
-                
-                if matching_hours:
-                    potential = potential[potential['שם'].isin(matching_hours)]
-                else:
-                    potential = potential.iloc[0:0]
-            
-            # בדיקת מכסה שבועית
-            if not potential.empty and week_key:
-                available_employees = []
-                for emp_name in potential['שם'].unique():
-                    emp_week_count = weekly_assignments.get(emp_name, {}).get(week_key, 0)
-                    if emp_week_count < WEEKLY_LIMIT:
-                        available_employees.append(emp_name)
-                
-                if available_employees:
-                    potential = potential[potential['שם'].isin(available_employees)]
-            
-            # בדיקת אט"ן
-            if "אט" in str(shift_row['סוג תקן']) and atan_col:
-                potential = potential[potential[atan_col] == 'כן']
-            
-            # שיבוץ
-            if not potential.empty:
-                potential['score'] = potential['שם'].map(lambda x: running_balance.get(x, 0))
-                best = potential.sort_values('score').iloc[0]['שם']
-                temp_schedule[shift_key] = best
-                temp_assigned[date_str].add(best)
-                running_balance[best] = running_balance.get(best, 0) + 1
-                
-                # עדכן ספירה שבועית
-                if week_key:
-                    if best not in weekly_assignments:
-                        weekly_assignments[best] = {}
-                    weekly_assignments[best][week_key] = weekly_assignments[best].get(week_key, 0) + 1
+    rows = inputs['day_shift_index'].get((slot['date'], slot['shift']), [])
+    candidates = req_df.iloc[rows]
+    candidates = candidates[~candidates['שם'].isin(already_working)]
+    candidates = candidates.drop_duplicates(subset=['שם'], keep='first').copy()
+    
+    # בדיקת אט"ן
+    atan_col = inputs['atan_col']
+    if slot['atan'] and atan_col:
+        authorized = candidates[atan_col].astype(str).str.strip() == 'כן'
+        candidates['מורשה אטן'] = np.where(authorized, '✅', '❌')
+    
+    names = candidates['שם'].tolist()
+    candidates['מאזן משמרות'] = [balance.get(name, 0) for name in names]
+    candidates['תחנה מבוקשת'] = candidates['תחנה']
+    matching = (candidates['תחנה'] == station).to_numpy()
+    candidates['התאמה'] = np.where(matching, '🎯 תחנה מתאימה', '⚪ תחנה אחרת')
     
-    return temp_schedule, temp_assigned
+    # מיון
+    candidates['sort_match'] = np.where(matching, 0, 1)
+    candidates = candidates.sort_values(['sort_match', 'מאזן משמרות'])
+    
+    # תווית לכל עובד - פעם אחת, ולא סינון של הטבלה לכל אפשרות ברדיו
+    candidates['תווית'] = [
+        f"👤 {name} • תחנה: {requested} • מאזן: {shifts}"
+        for name, requested, shifts in zip(candidates['שם'], candidates['תחנה מבוקשת'], candidates['מאזן משמרות'])
+    ]
+    return candidates
 
 @st.dialog("שיבוץ עובד", width="large")
-def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, balance, shi_df):
-    """דיאלוג שיבוץ ידני"""
+def show_assignment_dialog(slot, candidates):
+    """דיאלוג שיבוץ ידני - slot: שורה מטבלת המשבצות, candidates: build_dialog_candidates"""
+    shift_key, date_str, station, shift_type = slot['key'], slot['date'], slot['station'], slot['shift']
+    
     # פרטי משמרת
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -517,83 +606,43 @@ def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, bal
     
     st.markdown("---")
     
-    if not isinstance(st.session_state.assigned_today, dict):
-        st.session_state.assigned_today = {}
-    
-    already_working = st.session_state.assigned_today.get(date_str, set())
-    
-    # מועמדים
-    all_candidates = req_df[
-        (req_df['תאריך מבוקש'] == date_str) &
-        (req_df['משמרת'] == shift_type) &
-        (~req_df['שם'].isin(already_working))
-    ].copy()
+    is_atan_shift = bool(slot['atan'])
     
-    all_candidates = all_candidates.drop_duplicates(subset=['שם'], keep='first')
-    
-    # בדיקת אט"ן
-    shift_row = None
-    for idx, s in shi_df.iterrows():
-        test_key = f"{date_str}_{s['תחנה']}_{s['משמרת']}_{idx}"
-        if test_key == shift_key:
-            shift_row = s
-            break
-    
-    is_atan_shift = False
-    if shift_row is not None and "אט" in str(shift_row['סוג תקן']):
-        is_atan_shift = True
-        atan_col = get_atan_column(req_df)
-        if atan_col:
-            all_candidates['מורשה אטן'] = all_candidates[atan_col].apply(
-                lambda x: '✅' if str(x).strip() == 'כן' else '❌'
-            )
-    
-    if all_candidates.empty:
+    if candidates.empty:
         st.warning(f"😕 אין עובדים שביקשו {shift_type} ב-{date_str}")
         if st.button("סגור", width="stretch"):
             st.rerun()
     else:
-        # הכנת נתונים
-        all_candidates['מאזן משמרות'] = all_candidates['שם'].map(lambda x: balance.get(x, 0))
-        all_candidates['תחנה מבוקשת'] = all_candidates['תחנה']
-        all_candidates['התאמה'] = all_candidates['תחנה'].apply(
-            lambda x: '🎯 תחנה מתאימה' if x == station else '⚪ תחנה אחרת'
-        )
-        
-        # מיון
-        all_candidates['sort_match'] = all_candidates['תחנה'].apply(lambda x: 0 if x == station else 1)
-        all_candidates = all_candidates.sort_values(['sort_match', 'מאזן משמרות'])
-        
         # עמודות להצגה
         columns_to_show = ['שם', 'תחנה מבוקשת', 'מאזן משמרות', 'התאמה']
         
-        time_cols = [c for c in all_candidates.columns if 'שע' in c or 'זמן' in c]
+        time_cols = [c for c in candidates.columns if 'שע' in c or 'זמן' in c]
         if time_cols:
             columns_to_show.insert(2, time_cols[0])
         
-        if is_atan_shift and 'מורשה אטן' in all_candidates.columns:
+        if is_atan_shift and 'מורשה אטן' in candidates.columns:
             columns_to_show.insert(2, 'מורשה אטן')
         
-        columns_to_show = [c for c in columns_to_show if c in all_candidates.columns]
+        columns_to_show = [c for c in columns_to_show if c in candidates.columns]
         
         if is_atan_shift:
             st.info("ℹ️ משמרת אט\"ן - רק עובדים מורשים יכולים להישבץ")
         
         # טבלה
         st.dataframe(
-            all_candidates[columns_to_show],
+            candidates[columns_to_show],
             width="stretch",
             hide_index=True,
-            height=min(len(all_candidates) * 35 + 38, 300)
+            height=min(len(candidates) * 35 + 38, 300)
         )
         
         # סטטיסטיקה
-        matching_station = len(all_candidates[all_candidates['תחנה מבוקשת'] == station])
-        other_station = len(all_candidates) - matching_station
+        matching_station = int((candidates['sort_match'] == 0).sum())
+        other_station = len(candidates) - matching_station
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("סה\"כ זמינים", len(all_candidates))
+            st.metric("סה\"כ זמינים", len(candidates))
         with col2:
             st.metric("🎯 תחנה מתאימה", matching_station)
         with col3:
@@ -601,38 +650,41 @@ def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, bal
         
         st.markdown("---")
         
-        # בחירה
-        selectable_candidates = all_candidates.copy()
-        if is_atan_shift and 'מורשה אטן' in all_candidates.columns:
-            authorized = selectable_candidates[selectable_candidates['מורשה אטן'] == '✅']
-            unauthorized = selectable_candidates[selectable_candidates['מורשה אטן'] == '❌']
+        # בחירה - תוויות ותחנות מבוקשות לפי שם, בלי סינון לכל אפשרות
+        labels = dict(zip(candidates['שם'], candidates['תווית']))
+        requested_stations = dict(zip(candidates['שם'], candidates['תחנה מבוקשת']))
+        if is_atan_shift and 'מורשה אטן' in candidates.columns:
+            is_authorized = candidates['מורשה אטן'] == '✅'
+            authorized = candidates['שם'][is_authorized].tolist()
+            unauthorized = candidates['שם'][~is_authorized].tolist()
             
-            if not authorized.empty:
+            if authorized:
                 st.markdown("### ✅ עובדים מורשים לאט\"ן:")
                 selected = st.radio(
                     "בחר עובד מורשה:",
-                    options=authorized['שם'].tolist(),
-                    format_func=lambda x: f"👤 {x} • תחנה: {all_candidates[all_candidates['שם']==x]['תחנה מבוקשת'].values[0]} • מאזן: {balance.get(x, 0)}",
+                    options=authorized,
+                    format_func=labels.__getitem__,
                     label_visibility="collapsed"
                 )
                 
-                if not unauthorized.empty:
+                if unauthorized:
                     with st.expander(f"⚠️ {len(unauthorized)} עובדים ללא הרשאה"):
-                        for name in unauthorized['שם'].tolist():
+                        for name in unauthorized:
                             st.write(f"• {name}")
             else:
                 st.warning("⚠️ אין עובדים מורשים זמינים")
+                balances = dict(zip(candidates['שם'], candidates['מאזן משמרות']))
                 selected = st.radio(
                     "בחר עובד:",
-                    options=selectable_candidates['שם'].tolist(),
-                    format_func=lambda x: f"👤 {x} • מאזן: {balance.get(x, 0)}",
+                    options=candidates['שם'].tolist(),
+                    format_func=lambda x: f"👤 {x} • מאזן: {balances[x]}",
                     label_visibility="collapsed"
                 )
         else:
             selected = st.radio(
                 "בחר עובד לשיבוץ:",
-                options=selectable_candidates['שם'].tolist(),
-                format_func=lambda x: f"👤 {x} • תחנה: {all_candidates[all_candidates['שם']==x]['תחנה מבוקשת'].values[0]} • מאזן: {balance.get(x, 0)}",
+                options=candidates['שם'].tolist(),
+                format_func=labels.__getitem__,
                 label_visibility="visible"
             )
         
@@ -644,8 +696,9 @@ def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, bal
                 if date_str not in st.session_state.assigned_today:
                     st.session_state.assigned_today[date_str] = set()
                 st.session_state.assigned_today[date_str].add(selected)
+                bump_schedule_version()
                 
-                selected_station = all_candidates[all_candidates['שם'] == selected]['תחנה מבוקשת'].values[0]
+                selected_station = requested_stations[selected]
                 if selected_station != station:
                     st.info(f"ℹ️ {selected} ביקש/ה תחנה {selected_station} אך שובץ/ה לתחנה {station}")
                 
@@ -655,6 +708,154 @@ def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, bal
             if st.button("❌ ביטול", width="stretch"):
                 st.rerun()
 
+@st.fragment
+def export_panel(inputs, balance):
+    """כפתורי ייצוא ותצוגה מקדימה - קבצים נבנים רק בלחיצה ונשמרים לגרסת השיבוץ"""
+    schedule, cancelled = st.session_state.final_schedule, st.session_state.cancelled_shifts
+    if not schedule:
+        return
+    cache = get_export_cache(inputs, balance)
+    
+    # רץ גם מחוץ לריצת הסקריפט (ההורדה נבנית בלחיצה) - לכן בלי st.session_state
+    def build(fmt=None):
+        if 'df' not in cache:
+            cache['df'] = build_export_df(schedule, cancelled, inputs['req_df'], inputs['slots'], balance)
+        if fmt is None:
+            return cache['df']
+        if fmt not in cache:
+            cache[fmt] = write_export(cache['df'], fmt)
+        return cache[fmt]
+    
+    file_stem = f"shibutz_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    buttons = [('csv', "📥 ייצא CSV מלא"), ('parquet', "📦 Parquet")]
+    if XLSX_AVAILABLE:
+        buttons.append(('xlsx', "📊 Excel"))
+    
+    col_export, col_preview = st.columns([1, 3])
+    with col_export:
+        for fmt, label in buttons:
+            st.download_button(
+                label=label,
+                data=lambda fmt=fmt: build(fmt),
+                file_name=f"{file_stem}.{fmt}",
+                mime=EXPORT_FORMATS[fmt],
+                width="stretch",
+                type="primary" if fmt == 'csv' else "secondary",
+                on_click="ignore"
+            )
+    with col_preview:
+        if st.toggle("👁️ תצוגה מקדימה", key='show_export_preview'):
+            export_df = build()
+            st.dataframe(export_df.head(20), width="stretch", height=200)
+            cancelled_rows = int((export_df['סטטוס'] == 'מבוטל').sum())
+            st.caption(f"📊 {len(export_df) - cancelled_rows} משובצות + {cancelled_rows} מבוטלות")
+
+@st.fragment
+def board_panel(inputs, balance):
+    """מדדים + בורר שבוע + לוח - פעולה בתא מריצה מחדש את הקטע הזה (ראו handle_board_event)"""
+    shi_df, dates = inputs['shi_df'], inputs['dates']
+    panel_timer = PhaseTimer(enabled=st.session_state.get('profiling', False))
+    
+    # מדדים
+    if st.session_state.final_schedule:
+        total = len(shi_df) * len(dates) - len(st.session_state.cancelled_shifts)
+        assigned = len(st.session_state.final_schedule)
+        
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("סך משמרות", total)
+        c2.metric("משובצות", assigned)
+        c3.metric("חסרות", total - assigned)
+        c4.metric("השלמה", f"{assigned/total*100:.0f}%" if total > 0 else "0%")
+    
+    st.markdown("---")
+    
+    st.markdown("""
+    <div style="display: flex; justify-content: center; gap: 2rem; margin-bottom: 1rem; padding: 0.75rem; background: white; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
+        <div style="display: flex; align-items: center; gap: 0.5rem;">
+            <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #ffe5cc); border: 2px solid #ff8c00; border-radius: 4px;"></div>
+            <span style="font-weight: 600;">🌅 בוקר</span>
+        </div>
+        <div style="display: flex; align-items: center; gap: 0.5rem;">
+            <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #d4edda); border: 2px solid #28a745; border-radius: 4px;"></div>
+            <span style="font-weight: 600;">🌆 ערב</span>
+        </div>
+        <div style="display: flex; align-items: center; gap: 0.5rem;">
+            <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #d1e7ff); border: 2px solid #0066cc; border-radius: 4px;"></div>
+            <span style="font-weight: 600;">🌙 לילה</span>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # כל השבוע ברכיב אחד; אירוע אחד לכל לחיצה. רק השבוע הנבחר נבנה,
+    # כך שעלות הציור לא תלויה באורך טווח התכנון
+    with panel_timer.phase('board_render'):
+        slots = inputs['slots']
+        week_slots = slots[slots['week'] == select_board_week(inputs['weeks'])]
+        event = render_board(week_slots, st.session_state.final_schedule, st.session_state.cancelled_shifts)
+    panel_timer.log(logger, scope='board')
+    
+    if event:
+        handle_board_event(*event, inputs, balance)
+
+@st.fragment
+def missing_report_panel(inputs):
+    """דוח חוסרים - נבנה רק כשמוצג; עריכה בלוח שמשנה אותו מריצה הכל מחדש"""
+    shi_df, dates = inputs['shi_df'], inputs['dates']
+    total_shifts = len(shi_df) * len(dates)
+    missing_count = count_missing(inputs)
+    
+    if missing_count <= 0:
+        if st.session_state.final_schedule:
+            st.success("✅ כל המשמרות שובצו!")
+        return
+    
+    st.markdown("## 📋 דוח חוסרים")
+    st.warning(f"⚠️ {missing_count} משמרות חסרות מתוך {total_shifts}")
+    
+    col_toggle, col_refresh = st.columns([3, 1])
+    with col_toggle:
+        show_report = st.toggle(f"👁️ הצג דוח - {missing_count} משמרות", key='show_missing_report')
+    if not show_report:
+        return
+    with col_refresh:
+        # לחיצה מריצה מחדש את הדוח בלבד, מהשיבוץ העדכני
+        st.button("🔄 רענן", width="stretch")
+    
+    missing_df = build_missing_report(
+        dates, shi_df, inputs['req_df'], st.session_state.final_schedule,
+        st.session_state.cancelled_shifts, st.session_state.assigned_today, slots=inputs['slots']
+    )
+    
+    if not missing_df.empty:
+        st.dataframe(
+            missing_df,
+            width="stretch",
+            hide_index=True,
+            height=min(len(missing_df) * 35 + 38, 400)
+        )
+        
+        st.markdown("#### 📊 פירוט לפי סיבה:")
+        reason_counts = missing_df['סיבה'].value_counts()
+        
+        cols = st.columns(min(len(reason_counts), 4))
+        for i, (reason, count) in enumerate(reason_counts.items()):
+            with cols[i % len(cols)]:
+                st.metric(reason, count)
+        
+        st.markdown("---")
+        csv_missing = missing_df.to_csv(index=False, encoding='utf-8-sig')
+        st.download_button(
+            label="📥 ייצא דוח חוסרים",
+            data=csv_missing,
+            file_name=f"missing_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+            mime="text/csv",
+            width="stretch",
+            type="primary",
+            on_click="ignore"
+        )
+        
+        st.info("💡 ניתן לשבץ ידנית משמרות חסרות")
+
 # Session State
 if 'final_schedule' not in st.session_state:
     st.session_state.final_schedule = {}
@@ -662,14 +863,19 @@ if 'assigned_today' not in st.session_state:
     st.session_state.assigned_today = {}
 if 'cancelled_shifts' not in st.session_state:
     st.session_state.cancelled_shifts = set()
+if 'schedule_version' not in st.session_state:
+    st.session_state.schedule_version = 0
+
+# מדידת זמנים לריצה הנוכחית (כבויה כברירת מחדל)
+timer = PhaseTimer(enabled=st.session_state.get('profiling', False))
 
 # Sidebar
 with st.sidebar:
     st.markdown("# ⚙️ ניהול מערכת")
     
-    # אינדיקטור Firebase
-    if db:
-        st.success("🟢 Database מחובר")
+    # אינדיקטור Database
+    if store:
+        st.success(f"🟢 Database מחובר ({store.name})")
     else:
         st.warning("🟡 Database לא זמין")
     
@@ -700,13 +906,38 @@ with st.sidebar:
         "מכסה שבועית",
         min_value=1,
         max_value=7,
-        value=st.session_state.get('weekly_shift_limit', 5),
+        value=st.session_state.get('weekly_shift_limit', DEFAULT_WEEKLY_LIMIT),
         help="מספר מקסימלי למשמרות בשבוע"
     )
     st.session_state.weekly_shift_limit = weekly_limit
     
     st.caption(f"📊 עד {weekly_limit} משמרות/שבוע")
     
+    auto_repair = st.checkbox(
+        "השלמה אוטומטית אחרי שינוי",
+        value=st.session_state.get('auto_repair', True),
+        help="אחרי מחיקה/ביטול/שחזור - השלמת משבצות ריקות באותו שבוע בלבד"
+    )
+    st.session_state.auto_repair = auto_repair
+    
+    assign_mode = st.radio(
+        "מצב שיבוץ",
+        options=["חמדני", "אופטימלי"],
+        index=0 if st.session_state.get('assign_mode', "חמדני") == "חמדני" else 1,
+        help="אופטימלי: מקסימום כיסוי על כל הטווח ואז איזון מאזנים"
+    )
+    st.session_state.assign_mode = assign_mode
+    
+    if assign_mode == "אופטימלי":
+        solver_time_budget = st.number_input(
+            "מגבלת זמן (שניות)",
+            min_value=1,
+            max_value=300,
+            value=st.session_state.get('solver_time_budget', 10),
+            help="זמן מקסימלי לשיפור הכיסוי והאיזון"
+        )
+        st.session_state.solver_time_budget = solver_time_budget
+    
     st.divider()
     
     if req_file and shi_file:
@@ -716,81 +947,38 @@ with st.sidebar:
     
     if st.session_state.final_schedule:
         if st.button("💾 שמור ל-Database", type="primary", width="stretch"):
-            if not db:
+            if not store:
                 st.error("❌ Database לא זמין")
             else:
-                try:
-                    with st.spinner('שומר...'):
-                        # ספור משמרות לכל עובד
-                        employee_count = {}
-                        for shift_key, employee in st.session_state.final_schedule.items():
-                            employee_count[employee] = employee_count.get(employee, 0) + 1
-                        
-                        # עדכן רק את מספר המשמרות המצטבר לכל עובד
-                        batch = db.batch()
-                        for employee, current_shifts in employee_count.items():
-                            doc_ref = db.collection('employees').document(employee)
-                            
-                            # קרא מספר קיים אם יש
-                            existing_doc = doc_ref.get()
-                            previous_total = 0
-                            if existing_doc.exists:
-                                previous_total = existing_doc.to_dict().get('total_shifts', 0)
-                            
-                            # שמור רק שם + מספר מצטבר
-                            new_total = previous_total + current_shifts
-                            batch.set(doc_ref, {
-                                'name': employee,
-                                'total_shifts': new_total
-                            })
-                        
-                        batch.commit()
-                        st.success(f"✅ עודכנו {len(employee_count)} עובדים ב-Database!")
-                        
-                        with st.expander("📊 פירוט עדכון"):
-                            for employee, shifts in sorted(employee_count.items(), key=lambda x: x[1], reverse=True):
-                                doc_ref = db.collection('employees').document(employee)
-                                total = doc_ref.get().to_dict().get('total_shifts', 0)
-                                st.write(f"**{employee}**: {shifts} חדשות → סה\"כ {total} משמרות")
-                
-                except Exception as e:
-                    st.error(f"❌ שגיאה: {str(e)}")
+                # תמונת מצב לתור השמירה - חוזר מיד, הכתיבה ברקע
+                with timer.phase('db_save'):
+                    st.session_state.save_token = submit_save()
+    
+    if store and st.session_state.get('save_token'):
+        job = get_persistence_worker().status(st.session_state.save_token)
+        if job and job['state'] in (SAVED, FAILED):
+            show_save_status(job)
+        elif job:
+            st.fragment(watch_save_status, run_every=1.0)()
     
     # ייצוא מ-Database
-    if db:
+    if store:
         st.divider()
         st.markdown("### 📥 ייצוא מ-Database")
         
+        export_range = st.date_input("📆 טווח תאריכים (ריק = הכל)", value=(), format="DD/MM/YYYY")
+        range_start, range_end = (tuple(export_range) + (None, None))[:2]
+        
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("📥 ייצא משמרות", width="stretch"):
                 try:
-                    with st.spinner('מייצא מ-Database...'):
-                        # קרא את כל המשמרות
-                        shifts_ref = db.collection('shifts')
-                        docs = shifts_ref.stream()
-                        
-                        shifts_data = []
-                        for doc in docs:
-                            data = doc.to_dict()
-                            shifts_data.append({
-                                'shift_key': doc.id,
-                                'תאריך': data.get('date', ''),
-                                'תחנה': data.get('station', ''),
-                                'משמרת': data.get('shift_type', ''),
-                                'עובד': data.get('employee', ''),
-                                'סטטוס': data.get('status', ''),
-                                'זמן שמירה': str(data.get('timestamp', ''))
-                            })
+                    with st.spinner('מייצא מ-Database...'), timer.phase('db_export_shifts'):
+                        # שאילתה מסוננת לפי תאריך, רק שדות הייצוא, בדפים
+                        csv, rows = export_csv(store.export_shifts(range_start, range_end), SHIFT_EXPORT_FIELDS, "משמרות")
                         
-                        if shifts_data:
-                            shifts_df = pd.DataFrame(shifts_data)
-                            shifts_df['תאריך_sort'] = shifts_df['תאריך'].apply(parse_date_safe)
-                            shifts_df = shifts_df.sort_values(['תאריך_sort', 'תחנה'])
-                            shifts_df = shifts_df.drop(['shift_key', 'תאריך_sort'], axis=1)
-                            
-                            csv = shifts_df.to_csv(index=False, encoding='utf-8-sig')
+                        if rows:
                             st.download_button(
                                 "⬇️ הורד משמרות",
                                 csv,
@@ -798,7 +986,7 @@ with st.sidebar:
                                 mime="text/csv",
                                 width="stretch"
                             )
-                            st.info(f"📊 {len(shifts_data)} משמרות ב-Database")
+                            st.info(f"📊 {rows} משמרות ב-Database")
                         else:
                             st.warning("אין משמרות ב-Database")
                 
@@ -808,24 +996,11 @@ with st.sidebar:
         with col2:
             if st.button("📥 ייצא עובדים", width="stretch"):
                 try:
-                    with st.spinner('מייצא מ-Database...'):
-                        # קרא את כל העובדים
-                        employees_ref = db.collection('employees')
-                        docs = employees_ref.stream()
+                    with st.spinner('מייצא מ-Database...'), timer.phase('db_export_employees'):
+                        # ממוין לפי מאזן בשרת, רק שם ומאזן, בדפים
+                        csv, rows = export_csv(store.export_employees(), EMPLOYEE_EXPORT_FIELDS, "עובדים")
                         
-                        employees_data = []
-                        for doc in docs:
-                            data = doc.to_dict()
-                            employees_data.append({
-                                'שם': data.get('name', ''),
-                                'סה"כ משמרות': data.get('total_shifts', 0)
-                            })
-                        
-                        if employees_data:
-                            employees_df = pd.DataFrame(employees_data)
-                            employees_df = employees_df.sort_values('סה"כ משמרות', ascending=False)
-                            
-                            csv = employees_df.to_csv(index=False, encoding='utf-8-sig')
+                        if rows:
                             st.download_button(
                                 "⬇️ הורד עובדים",
                                 csv,
@@ -833,11 +1008,12 @@ with st.sidebar:
                                 mime="text/csv",
                                 width="stretch"
                             )
-                            st.info(f"👥 {len(employees_data)} עובדים ב-Database")
+                            st.info(f"👥 {rows} עובדים ב-Database")
                             
                             # תצוגה מקדימה
                             with st.expander("👁️ תצוגה מקדימה"):
-                                st.dataframe(employees_df.head(10), width="stretch", hide_index=True)
+                                preview = pd.read_csv(io.BytesIO(csv), nrows=10, encoding='utf-8-sig')
+                                st.dataframe(preview, width="stretch", hide_index=True)
                         else:
                             st.warning("אין עובדים ב-Database")
                 
@@ -857,65 +1033,20 @@ with st.sidebar:
             st.metric("משמרות", len(st.session_state.final_schedule))
         with c2:
             st.metric("עובדים", len(set(st.session_state.final_schedule.values())))
+    
+    st.checkbox("⏱️ מדידת ביצועים", key='profiling', help="זמן וקריאות לכל שלב בריצה")
+    timing_panel = st.empty()
 
 # Main
 st.title("📅 לוח שיבוצים")
 
 if req_file and shi_file:
     try:
-        # קרא קבצים עם טיפול בגרשיים ו-BOM
-        req_df = pd.read_csv(req_file, encoding='utf-8-sig', quotechar='"', doublequote=True)
-        shi_df = pd.read_csv(shi_file, encoding='utf-8-sig', quotechar='"', doublequote=True)
-        
-        # נקה רווחים מיותרים משמות עמודות
-        req_df.columns = req_df.columns.str.strip()
-        shi_df.columns = shi_df.columns.str.strip()
-        
-        # רשום תיקונים שבוצעו
-        corrections = []
-        
-        # נקה רווחים מתוכן השעות (אם קיים)
-        for df_name, df in [('בקשות', req_df), ('משמרות', shi_df)]:
-            time_cols = [c for c in df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower()]
-            for col in time_cols:
-                if col in df.columns:
-                    # בדוק אם יש רווחים
-                    has_spaces = df[col].astype(str).str.contains(' ').any()
-                    df[col] = df[col].astype(str).str.replace(' ', '')
-                    if has_spaces:
-                        corrections.append(f"נוקו רווחים מעמודת שעות בקובץ {df_name}")
-        
-        # תקן פורמט שעות הפוך (23:00-15:00 -> 15:00-23:00)
-        for df_name, df in [('בקשות', req_df), ('משמרות', shi_df)]:
-            time_cols = [c for c in df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower()]
-            for col in time_cols:
-                if col in df.columns:
-                    # תקן שעות שמתחילות בשעה גבוהה ומסתיימות בנמוכה
-                    def fix_time_format(time_str):
-                        if pd.isna(time_str) or str(time_str).strip() == '' or str(time_str) == 'nan':
-                            return time_str
-                        time_str = str(time_str).strip()
-                        if '-' in time_str:
-                            parts = time_str.split('-')
-                            if len(parts) == 2:
-                                start, end = parts[0].strip(), parts[1].strip()
-                                # אם השעה מתחילה אחרי שהיא מסתיימת, החלף
-                                try:
-                                    start_hour = int(start.split(':')[0])
-                                    end_hour = int(end.split(':')[0])
-                                    if start_hour > end_hour:
-                                        return f"{end}-{start}"
-                                except:
-                                    pass
-                        return time_str
-                    
-                    # החל את התיקון וספור כמה תוקנו
-                    original_values = df[col].copy()
-                    df[col] = df[col].apply(fix_time_format)
-                    fixed_count = (original_values != df[col]).sum()
-                    
-                    if fixed_count > 0:
-                        corrections.append(f"תוקנו {fixed_count} שעות הפוכות בקובץ {df_name}")
+        # קרא ונרמל קבצים (שעות, ולידציה, תאריכים) - פעם אחת לכל תוכן קובץ
+        with timer.phase('ingest'):
+            inputs = load_uploads(req_file, shi_file)
+        req_df, shi_df = inputs['req_df'], inputs['shi_df']
+        corrections, errors = inputs['corrections'], inputs['errors']
         
         # הצג הודעות תיקון
         if corrections:
@@ -923,7 +1054,6 @@ if req_file and shi_file:
                 for correction in corrections:
                     st.info(f"✓ {correction}")
         
-        errors = validate_dataframes(req_df, shi_df)
         if errors:
             for e in errors:
                 st.error(e)
@@ -938,144 +1068,50 @@ if req_file and shi_file:
         with col3:
             st.success(f"✅ {len(req_df['שם'].unique())} עובדים")
         with col4:
-            atan_col = get_atan_column(req_df)
+            atan_col = inputs['atan_col']
             if atan_col:
                 atan_count = len(req_df[req_df[atan_col] == 'כן'])
                 st.success(f"✅ {atan_count} מורשי אט\"ן")
             else:
                 st.info("ℹ️ אין עמודת אט\"ן")
         
-        dates = sorted(req_df['תאריך מבוקש'].unique(), key=parse_date_safe)
-        balance = get_balance()
+        # תאריכים ומשבצות - נבנו פעם אחת בקליטה
+        dates = inputs['dates']
+        with timer.phase('get_balance'):
+            balance = get_balance()
         
         # הצג טווח תאריכים
         if dates:
             st.info(f"📅 תאריכים: {dates[0]} עד {dates[-1]} ({len(dates)} ימים)")
         
-        # ייצוא
-        if st.session_state.final_schedule:
-            export_data = []
-            
-            for shift_key, employee in st.session_state.final_schedule.items():
-                parts = shift_key.split('_')
-                date_str, station, shift_type = parts[0], parts[1], parts[2]
-                shift_idx = int(parts[3]) if len(parts) > 3 else 0
-                
-                shift_row = None
-                if shift_idx < len(shi_df):
-                    row = shi_df.iloc[shift_idx]
-                    if row['תחנה'] == station and row['משמרת'] == shift_type:
-                        shift_row = row
-                
-                if shift_row is None:
-                    matching = shi_df[(shi_df['תחנה'] == station) & (shi_df['משמרת'] == shift_type)]
-                    if not matching.empty:
-                        shift_row = matching.iloc[0]
-                
-                hours = ""
-                emp_request = req_df[
-                    (req_df['שם'] == employee) &
-                    (req_df['תאריך מבוקש'] == date_str) &
-                    (req_df['משמרת'] == shift_type)
-                ]
-                
-                if not emp_request.empty:
-                    time_cols = [c for c in emp_request.columns if 'שע' in c or 'זמן' in c]
-                    if time_cols:
-                        hours_val = emp_request.iloc[0][time_cols[0]]
-                        if pd.notna(hours_val):
-                            hours = str(hours_val)
-                
-                requested_station = station
-                if not emp_request.empty and 'תחנה' in emp_request.columns:
-                    requested_station = emp_request.iloc[0]['תחנה']
-                
-                export_data.append({
-                    'תאריך': date_str,
-                    'יום': get_day_name(date_str),
-                    'שעות': hours,
-                    'משמרת': shift_type,
-                    'תחנה משובצת': station,
-                    'תחנה מבוקשת': requested_station,
-                    'סוג תקן': shift_row['סוג תקן'] if shift_row is not None else '',
-                    'שם עובד': employee,
-                    'מאזן משמרות': balance.get(employee, 0),
-                    'סטטוס': 'משובץ'
-                })
-            
-            cancelled_data = []
-            for shift_key in st.session_state.cancelled_shifts:
-                parts = shift_key.split('_')
-                date_str, station, shift_type = parts[0], parts[1], parts[2]
-                shift_idx = int(parts[3]) if len(parts) > 3 else 0
-                
-                shift_row = None
-                if shift_idx < len(shi_df):
-                    row = shi_df.iloc[shift_idx]
-                    if row['תחנה'] == station and row['משמרת'] == shift_type:
-                        shift_row = row
-                
-                if shift_row is None:
-                    matching = shi_df[(shi_df['תחנה'] == station) & (shi_df['משמרת'] == shift_type)]
-                    if not matching.empty:
-                        shift_row = matching.iloc[0]
-                
-                cancelled_data.append({
-                    'תאריך': date_str,
-                    'יום': get_day_name(date_str),
-                    'שעות': '',
-                    'משמרת': shift_type,
-                    'תחנה משובצת': station,
-                    'תחנה מבוקשת': '',
-                    'סוג תקן': shift_row['סוג תקן'] if shift_row is not None else '',
-                    'שם עובד': '',
-                    'מאזן משמרות': 0,  # Changed from '' to 0
-                    'סטטוס': 'מבוטל'
-                })
-            
-            all_export_data = export_data + cancelled_data
-            
-            if all_export_data:
-                export_df = pd.DataFrame(all_export_data)
-                
-                # Convert balance column to numeric to avoid Arrow serialization issues
-                export_df['מאזן משמרות'] = pd.to_numeric(export_df['מאזן משמרות'], errors='coerce').fillna(0).astype(int)
-                
-                export_df['תאריך_sort'] = export_df['תאריך'].apply(parse_date_safe)
-                export_df = export_df.sort_values(['תאריך_sort', 'תחנה משובצת', 'משמרת'])
-                export_df = export_df.drop('תאריך_sort', axis=1)
-                
-                csv = export_df.to_csv(index=False, encoding='utf-8-sig')
-                
-                col_export, col_preview = st.columns([1, 3])
-                with col_export:
-                    st.download_button(
-                        label="📥 ייצא CSV מלא",
-                        data=csv,
-                        file_name=f"shibutz_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                        mime="text/csv",
-                        width="stretch",
-                        type="primary"
-                    )
-                with col_preview:
-                    with st.expander("👁️ תצוגה מקדימה"):
-                        st.dataframe(export_df.head(20), width="stretch", height=200)
-                        st.caption(f"📊 {len(export_data)} משובצות + {len(cancelled_data)} מבוטלות")
+        # ייצוא - הקובץ נבנה רק בלחיצה
+        with timer.phase('export'):
+            export_panel(inputs, balance)
         
         st.markdown("---")
         
         # שיבוץ אוטומטי
         if st.session_state.get('trigger_auto'):
             # הצג מידע על מאזן מה-Database
-            if db and balance:
+            if store and balance:
                 employees_with_history = [emp for emp in balance.keys() if balance[emp] > 0]
                 if employees_with_history:
                     st.info(f"📊 נטען מאזן מ-Database: {len(employees_with_history)} עובדים עם היסטוריה")
             
-            with st.spinner('מבצע שיבוץ...'):
-                temp_schedule, temp_assigned = auto_assign(dates, shi_df, req_df, balance)
+            with st.spinner('מבצע שיבוץ...'), timer.phase('assign'):
+                if st.session_state.get('assign_mode') == "אופטימלי":
+                    temp_schedule, temp_assigned = optimal_assign(
+                        dates, shi_df, req_df, balance,
+                        time_budget=st.session_state.get('solver_time_budget', 10),
+                        slots=inputs['slots'], **get_engine_settings()
+                    )
+                else:
+                    temp_schedule, temp_assigned = auto_assign(
+                        dates, shi_df, req_df, balance, slots=inputs['slots'], **get_engine_settings()
+                    )
                 st.session_state.final_schedule, st.session_state.assigned_today = temp_schedule, temp_assigned
                 st.session_state.trigger_auto = False
+                bump_schedule_version()
             
             total_shifts = len(shi_df) * len(dates)
             assigned_count = len(st.session_state.final_schedule)
@@ -1090,216 +1126,25 @@ if req_file and shi_file:
             
             st.rerun()
         
-        # מדדים
-        if st.session_state.final_schedule:
-            total = len(shi_df) * len(dates) - len(st.session_state.cancelled_shifts)
-            assigned = len(st.session_state.final_schedule)
-            
-            c1, c2, c3, c4 = st.columns(4)
-            c1.metric("סך משמרות", total)
-            c2.metric("משובצות", assigned)
-            c3.metric("חסרות", total - assigned)
-            c4.metric("השלמה", f"{assigned/total*100:.0f}%" if total > 0 else "0%")
-        
-        st.markdown("---")
-        
-        # לוח שיבוץ
-        
-        # אגדת צבעים
-        st.markdown("""
-        <div style="display: flex; justify-content: center; gap: 2rem; margin-bottom: 1rem; padding: 0.75rem; background: white; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-            <div style="display: flex; align-items: center; gap: 0.5rem;">
-                <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #ffe5cc); border: 2px solid #ff8c00; border-radius: 4px;"></div>
-                <span style="font-weight: 600;">🌅 בוקר</span>
-            </div>
-            <div style="display: flex; align-items: center; gap: 0.5rem;">
-                <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #d4edda); border: 2px solid #28a745; border-radius: 4px;"></div>
-                <span style="font-weight: 600;">🌆 ערב</span>
-            </div>
-            <div style="display: flex; align-items: center; gap: 0.5rem;">
-                <div style="width: 20px; height: 20px; background: linear-gradient(to left, #ffffff, #d1e7ff); border: 2px solid #0066cc; border-radius: 4px;"></div>
-                <span style="font-weight: 600;">🌙 לילה</span>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        header_cols = st.columns(7)
-        for i, d in enumerate(dates[:7]):
-            with header_cols[i]:
-                st.markdown(f'''
-                <div class="day-header">
-                    <span class="day-name">{get_day_name(d)}</span>
-                    <span class="day-date">{d}</span>
-                </div>
-                ''', unsafe_allow_html=True)
-        
-        for idx, shift_row in shi_df.iterrows():
-            cols = st.columns(7)
-            for i, date_str in enumerate(dates[:7]):
-                if i < len(cols):
-                    with cols[i]:
-                        shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-                        
-                        # קבע צבע לפי סוג משמרת
-                        shift_type_class = ""
-                        shift_name = str(shift_row['משמרת']).lower()
-                        if 'בוקר' in shift_name:
-                            shift_type_class = "morning"
-                        elif 'ערב' in shift_name:
-                            shift_type_class = "evening"
-                        elif 'לילה' in shift_name:
-                            shift_type_class = "night"
-                        
-                        if shift_key in st.session_state.cancelled_shifts:
-                            is_atan = "אט" in str(shift_row['סוג תקן'])
-                            atan_badge = " 🔒" if is_atan else ""
-                            st.markdown(f'''
-                            <div class="shift-card cancelled {shift_type_class}">
-                                <div class="shift-header">
-                                    <span class="shift-title">{shift_row['משמרת']}{atan_badge}</span>
-                                    <span class="status-badge status-cancelled">מבוטל</span>
-                                </div>
-                                <div class="shift-station" style="font-size: 0.85rem;">{shift_row['תחנה']} • {shift_row['סוג תקן']}</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                            
-                            if st.button("🔄", key=f"restore_{shift_key}", width="stretch"):
-                                st.session_state.cancelled_shifts.remove(shift_key)
-                                st.rerun()
-                        
-                        elif shift_key in st.session_state.final_schedule:
-                            employee = st.session_state.final_schedule[shift_key]
-                            is_atan = "אט" in str(shift_row['סוג תקן'])
-                            atan_badge = " 🔒" if is_atan else ""
-                            st.markdown(f'''
-                            <div class="shift-card assigned {shift_type_class}">
-                                <div class="shift-header">
-                                    <span class="shift-title">{shift_row['משמרת']}{atan_badge}</span>
-                                    <span class="status-badge status-assigned">✓</span>
-                                </div>
-                                <div class="shift-employee">{employee}</div>
-                                <div class="shift-station" style="font-size: 0.85rem;">{shift_row['תחנה']} • {shift_row['סוג תקן']}</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                            
-                            ca, cb = st.columns([3, 1])
-                            with ca:
-                                if st.button("🗑️", key=f"del_{shift_key}"):
-                                    del st.session_state.final_schedule[shift_key]
-                                    if date_str in st.session_state.assigned_today:
-                                        st.session_state.assigned_today[date_str].discard(employee)
-                                    st.rerun()
-                            with cb:
-                                if st.button("🚫", key=f"cancel_{shift_key}"):
-                                    st.session_state.cancelled_shifts.add(shift_key)
-                                    st.rerun()
-                        
-                        else:
-                            is_atan = "אט" in str(shift_row['סוג תקן'])
-                            atan_badge = " 🔒" if is_atan else ""
-                            st.markdown(f'''
-                            <div class="shift-card empty {shift_type_class}">
-                                <div class="shift-header">
-                                    <span class="shift-title">{shift_row['משמרת']}{atan_badge}</span>
-                                    <span class="status-badge status-empty">ריק</span>
-                                </div>
-                                <div class="shift-station" style="font-size: 0.85rem;">{shift_row['תחנה']} • {shift_row['סוג תקן']}</div>
-                            </div>
-                            ''', unsafe_allow_html=True)
-                            
-                            ca, cb = st.columns([3, 1])
-                            with ca:
-                                if st.button("➕ שבץ", key=f"assign_{shift_key}"):
-                                    show_assignment_dialog(shift_key, date_str, shift_row['תחנה'], 
-                                                         shift_row['משמרת'], req_df, balance, shi_df)
-                            with cb:
-                                if st.button("🚫", key=f"cancel_{shift_key}"):
-                                    st.session_state.cancelled_shifts.add(shift_key)
-                                    st.rerun()
+        # לוח ודוח חוסרים - כל אחד מתרענן בנפרד
+        with timer.phase('board'):
+            board_panel(inputs, balance)
         
-        # דוח חוסרים
         st.markdown("---")
         st.markdown("---")
         
-        total_shifts = len(shi_df) * len(dates)
-        assigned_count = len(st.session_state.final_schedule)
-        cancelled_count = len(st.session_state.cancelled_shifts)
-        missing_count = total_shifts - assigned_count - cancelled_count
-        
-        if missing_count > 0:
-            st.markdown("## 📋 דוח חוסרים")
-            st.warning(f"⚠️ {missing_count} משמרות חסרות מתוך {total_shifts}")
-            
-            with st.expander(f"👁️ הצג דוח - {missing_count} משמרות", expanded=False):
-                missing_shifts = []
-                
-                for date_str in dates:
-                    for idx, shift_row in shi_df.iterrows():
-                        shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-                        
-                        if shift_key not in st.session_state.final_schedule and shift_key not in st.session_state.cancelled_shifts:
-                            potential = req_df[
-                                (req_df['תאריך מבוקש'] == date_str) &
-                                (req_df['משמרת'] == shift_row['משמרת']) &
-                                (req_df['תחנה'] == shift_row['תחנה'])
-                            ].copy()
-                            
-                            if potential.empty:
-                                reason = "אין בקשות"
-                            else:
-                                already_working = st.session_state.assigned_today.get(date_str, set())
-                                available = potential[~potential['שם'].isin(already_working)]
-                                
-                                if available.empty:
-                                    reason = f"כל המבקשים משובצים ({len(potential)})"
-                                else:
-                                    reason = "לא ידוע"
-                            
-                            missing_shifts.append({
-                                'תאריך': date_str,
-                                'יום': get_day_name(date_str),
-                                'תחנה': shift_row['תחנה'],
-                                'משמרת': shift_row['משמרת'],
-                                'סוג תקן': shift_row['סוג תקן'],
-                                'סיבה': reason
-                            })
-                
-                if missing_shifts:
-                    missing_df = pd.DataFrame(missing_shifts)
-                    
-                    st.dataframe(
-                        missing_df,
-                        width="stretch",
-                        hide_index=True,
-                        height=min(len(missing_df) * 35 + 38, 400)
-                    )
-                    
-                    st.markdown("#### 📊 פירוט לפי סיבה:")
-                    reason_counts = missing_df['סיבה'].value_counts()
-                    
-                    cols = st.columns(min(len(reason_counts), 4))
-                    for i, (reason, count) in enumerate(reason_counts.items()):
-                        with cols[i % len(cols)]:
-                            st.metric(reason, count)
-                    
-                    st.markdown("---")
-                    csv_missing = missing_df.to_csv(index=False, encoding='utf-8-sig')
-                    st.download_button(
-                        label="📥 ייצא דוח חוסרים",
-                        data=csv_missing,
-                        file_name=f"missing_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                        mime="text/csv",
-                        width="stretch",
-                        type="primary"
-                    )
-                    
-                    st.info("💡 ניתן לשבץ ידנית משמרות חסרות")
-        else:
-            if st.session_state.final_schedule:
-                st.success("✅ כל המשמרות שובצו!")
+        with timer.phase('missing_report'):
+            missing_report_panel(inputs)
     
     except Exception as e:
         st.error(f"❌ שגיאה: {str(e)}")
         logger.error(f"Error: {e}", exc_info=True)
 else:
     st.info("📁 העלה קבצי בקשות ומשמרות להתחלה")
+
+# פאנל זמנים + שורת לוג JSON
+if timer.enabled:
+    timer.log(logger)
+    with timing_panel.container():
+        with st.expander(f"⏱️ זמני ריצה ({timer.total_ms():.0f} ms)"):
+            st.dataframe(pd.DataFrame(timer.summary()), width="stretch", hide_index=True)
@@ -0,0 +1,136 @@
+"""
+בנצ'מרק לשיבוץ האוטומטי - השוואה מול המנוע הקודם (סינון DataFrame + מיון)
+
+המנוע הקודם ממיין מועמדים ב-sort_values ברירת המחדל (quicksort, לא יציב),
+כך שבשוויון מאזן הבחירה בו תלויה במימוש המיון ולא בסדר הקובץ. המנוע החדש
+שובר שוויון לפי סדר הקובץ. לכן יש שתי בדיקות: זהות מלאה (מדווחת בלבד -
+יכולה להיכשל על שוויון) והתאמה לכללים - בכל משבצת המנוע בחר אחד מהמועמדים
+עם המאזן הנמוך ביותר לפי המנוע הקודם (נכשלת על כל הבדל אחר).
+
+הרצה:
+    python benchmarks/bench_auto_assign.py
+"""
+
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler_core  # noqa: E402
+from generate_data import make_dataset  # noqa: E402
+
+def reference_auto_assign(dates, shi_df, req_df, balance, weekly_limit=5, strict_hours=True, cancelled=frozenset(),
+                          follow=None):
+    """המנוע הקודם: מסכה על כל req_df לכל משבצת ומיון לפי מאזן
+
+    follow - שיבוץ לבדיקה: כשהבחירה בו היא אחד המועמדים עם המאזן הנמוך
+    ביותר, ממשיכים ממנה במקום מהמיון; כל הבדל אחר מופיע בפלט.
+    """
+    temp_schedule, temp_assigned = {}, {d: set() for d in dates}
+    running_balance = balance.copy()
+    atan_col = scheduler_core.get_atan_column(req_df)
+    weekly_assignments = {}
+    time_cols = [c for c in req_df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower() or 'time' in c.lower()]
+    shift_time_cols = [c for c in shi_df.columns if 'שע' in c or 'זמן' in c or 'hour' in c.lower() or 'time' in c.lower()]
+    date_dim = scheduler_core.build_date_dimension(dates)
+    
+    def hours_of(row, cols):
+        if cols and pd.notna(row[cols[0]]):
+            return str(row[cols[0]]).strip().replace(' ', '')
+        return None
+    
+    for date_str in dates:
+        week_key = scheduler_core.get_week_start(date_str, date_dim)
+        for idx, shift_row in shi_df.iterrows():
+            shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
+            if shift_key in cancelled:
+                continue
+            
+            potential = req_df[
+                (req_df['תאריך מבוקש'] == date_str) &
+                (req_df['משמרת'] == shift_row['משמרת']) &
+                (req_df['תחנה'] == shift_row['תחנה']) &
+                (~req_df['שם'].isin(temp_assigned[date_str]))
+            ].copy()
+            
+            shift_hours = hours_of(shift_row, shift_time_cols)
+            if strict_hours and shift_hours and not potential.empty:
+                matching = [r['שם'] for _, r in potential.iterrows() if hours_of(r, time_cols) == shift_hours]
+                potential = potential[potential['שם'].isin(matching)]
+            
+            if not potential.empty:
+                available = [
+                    name for name in potential['שם'].unique()
+                    if weekly_assignments.get(name, {}).get(week_key, 0) < weekly_limit
+                ]
+                if available:
+                    potential = potential[potential['שם'].isin(available)]
+            
+            if "אט" in str(shift_row['סוג תקן']) and atan_col:
+                potential = potential[potential[atan_col] == 'כן']
+            
+            if not potential.empty:
+                potential['score'] = potential['שם'].map(lambda x: running_balance.get(x, 0))
+                best = potential.sort_values('score').iloc[0]['שם']
+                if follow is not None:
+                    tied = set(potential.loc[potential['score'] == potential['score'].min(), 'שם'])
+                    if follow.get(shift_key) in tied:
+                        best = follow[shift_key]
+                temp_schedule[shift_key] = best
+                temp_assigned[date_str].add(best)
+                running_balance[best] = running_balance.get(best, 0) + 1
+                weekly_assignments.setdefault(best, {})
+                weekly_assignments[best][week_key] = weekly_assignments[best].get(week_key, 0) + 1
+    
+    return temp_schedule, temp_assigned
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def check_identical():
+    """השוואת פלט מלאה על מגוון הגדרות"""
+    mismatches, tie_differences = 0, 0
+    for seed in range(4):
+        req_df, shi_df, dates = make_dataset(60 + 20 * seed, 3 + seed % 3, 10, seed=seed)
+        rng = random.Random(seed)
+        balance = {f'עובד {i}': rng.randint(0, 4) for i in range(0, 120, 3)}
+        first = shi_df.iloc[0]
+        cancelled = {f"{dates[1]}_{first['תחנה']}_{first['משמרת']}_0"}
+        for strict_hours in (True, False):
+            for weekly_limit in (1, 3, 5):
+                settings = dict(weekly_limit=weekly_limit, strict_hours=strict_hours, cancelled=cancelled)
+                actual = scheduler_core.auto_assign(dates, shi_df, req_df, balance, **settings)
+                if actual != reference_auto_assign(dates, shi_df, req_df, balance, **settings):
+                    tie_differences += 1
+                if actual != reference_auto_assign(dates, shi_df, req_df, balance, follow=actual[0], **settings):
+                    mismatches += 1
+                    print(f"❌ seed={seed} strict={strict_hours} limit={weekly_limit}")
+    if tie_differences:
+        print(f"ℹ️ {tie_differences} הגדרות שונות מהמנוע הקודם בשבירת שוויון מאזן")
+    print("✅ הבחירות תואמות לכללי המנוע הקודם" if not mismatches else f"❌ {mismatches} הגדרות שונות")
+    return mismatches == 0
+
+def run_timings():
+    print(f"{'employees':>10} {'days':>5} {'slots':>7} {'requests':>9} {'reference':>10} {'engine':>8}")
+    for n_employees, n_days, with_reference in [(200, 14, True), (1500, 30, True), (1500, 90, False)]:
+        req_df, shi_df, dates = make_dataset(n_employees, 10, n_days, seed=1)
+        actual, engine_time = timed(scheduler_core.auto_assign, dates, shi_df, req_df, {})
+        reference = '-'
+        if with_reference:
+            _, reference_time = timed(reference_auto_assign, dates, shi_df, req_df, {})
+            followed = reference_auto_assign(dates, shi_df, req_df, {}, follow=actual[0])
+            assert actual == followed, "engine output breaks the reference rules"
+            reference = f"{reference_time:.2f}s"
+        print(f"{n_employees:>10} {n_days:>5} {len(shi_df) * n_days:>7} {len(req_df):>9} "
+              f"{reference:>10} {engine_time:>7.3f}s")
+
+if __name__ == '__main__':
+    ok = check_identical()
+    run_timings()
+    sys.exit(0 if ok else 1)
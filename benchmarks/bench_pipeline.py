@@ -0,0 +1,141 @@
+"""
+בנצ'מרק לכל שלבי הצינור: קליטה, נרמול, תאריכים, מאזן, שיבוץ, ייצוא, דוח חוסרים
+
+התוצאות נשמרות כ-JSON תחת benchmarks/results, וניתן להשוות מול ריצה קודמת:
+
+    python benchmarks/bench_pipeline.py --scales small medium --label before
+    python benchmarks/bench_pipeline.py --scales small medium --compare benchmarks/results/before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import scheduler_core  # noqa: E402
+from generate_data import write_dataset  # noqa: E402
+
+# (עובדים, תחנות, ימים)
+SCALES = {
+    'small': (200, 6, 14),
+    'medium': (1500, 10, 30),
+    'large': (1500, 20, 90),
+}
+STAGES = ['load', 'normalize', 'dates', 'slots', 'balance', 'assign', 'export', 'missing_report']
+REGRESSION_THRESHOLD = 1.25
+
+def run_pipeline(paths):
+    """ריצה אחת של כל השלבים - מחזיר זמן לכל שלב בשניות"""
+    timings = {}
+    
+    def stage(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[name] = time.perf_counter() - start
+        return result
+    
+    req_df, shi_df = stage('load', lambda: (
+        scheduler_core.read_csv_file(paths['requests']),
+        scheduler_core.read_csv_file(paths['shifts']),
+    ))
+    stage('normalize', lambda: scheduler_core.prepare_inputs(req_df, shi_df))
+    date_dim = stage('dates', lambda: scheduler_core.build_date_dimension(req_df['תאריך מבוקש']))
+    dates = scheduler_core.sort_dates(date_dim)
+    slots = stage('slots', lambda: scheduler_core.build_slot_table(dates, shi_df, date_dim))
+    balance = stage('balance', lambda: scheduler_core.load_balance_csv(paths['balance']))
+    schedule, assigned_today = stage('assign', lambda: scheduler_core.auto_assign(
+        dates, shi_df, req_df, balance, slots=slots
+    ))
+    stage('export', lambda: scheduler_core.build_export_df(
+        schedule, set(), req_df, slots, balance
+    ).to_csv(index=False, encoding='utf-8-sig'))
+    stage('missing_report', lambda: scheduler_core.build_missing_report(
+        dates, shi_df, req_df, schedule, set(), assigned_today, slots=slots
+    ))
+    
+    return timings, {'requests': len(req_df), 'slots': len(shi_df) * len(dates), 'assigned': len(schedule)}
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def compare(results, baseline_path):
+    """השוואה מול קובץ תוצאות קודם - מסמן שלבים שהאטו מעבר לסף"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"\nהשוואה מול {baseline_path} ({baseline.get('revision', '?')})")
+    for scale, data in results['scales'].items():
+        old = baseline['scales'].get(scale)
+        if not old:
+            continue
+        for name in STAGES:
+            before, after = old['timings'].get(name), data['timings'].get(name)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            flag = ''
+            if ratio > REGRESSION_THRESHOLD and after - before > 0.01:
+                flag = ' ⚠️ regression'
+                regressions += 1
+            print(f"{scale:>8} {name:>15} {before:>9.4f}s -> {after:>9.4f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=3, help='best-of-N per scale')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', help='results file name (default: revision + timestamp)')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    args = parser.parse_args()
+    
+    results = {
+        'revision': git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'scales': {},
+    }
+    
+    print(f"{'scale':>8} {'requests':>9} {'slots':>7} " + ' '.join(f"{s:>14}" for s in STAGES))
+    for scale in args.scales:
+        n_employees, n_stations, n_days = SCALES[scale]
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_dataset(tmp, n_employees, n_stations, n_days, seed=args.seed, messy_ratio=0.05)
+            runs = [run_pipeline(paths) for _ in range(args.repeat)]
+        timings = {name: min(run[0][name] for run in runs) for name in STAGES}
+        sizes = runs[0][1]
+        results['scales'][scale] = {'params': SCALES[scale], 'sizes': sizes, 'timings': timings}
+        print(f"{scale:>8} {sizes['requests']:>9} {sizes['slots']:>7} "
+              + ' '.join(f"{timings[s]:>13.4f}s" for s in STAGES))
+    
+    out_dir = os.path.join(BENCH_DIR, 'results')
+    os.makedirs(out_dir, exist_ok=True)
+    label = args.label or f"{results['revision'] or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    out_path = os.path.join(out_dir, f"{label}.json")
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nנשמר: {out_path}")
+    
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
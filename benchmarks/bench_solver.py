@@ -0,0 +1,64 @@
+"""
+בנצ'מרק למצב האופטימלי מול השיבוץ החמדני - כיסוי, פיזור מאזן וזמן ריצה
+
+הרצה:
+    python benchmarks/bench_solver.py [--budget 30] [--max-slots 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler_core  # noqa: E402
+from generate_data import make_dataset  # noqa: E402
+
+# (עובדים, תחנות, ימים) - מספר המשבצות ≈ 6 שורות תבנית לתחנה × ימים
+SCALES = [
+    (200, 6, 14),
+    (1500, 20, 30),
+    (1500, 60, 90),
+    (3000, 180, 90),
+]
+
+def summarize(schedule, slot_table, weekly_limit):
+    """כיסוי, פיזור מאזן וחריגות ממכסה שבועית"""
+    per_employee = Counter(schedule.values())
+    rows = scheduler_core.slot_rows(slot_table, schedule)
+    per_week = Counter(zip((schedule[key] for key in rows['key']), rows['week']))
+    spread = max(per_employee.values()) - min(per_employee.values()) if per_employee else 0
+    over_limit = sum(1 for count in per_week.values() if count > weekly_limit)
+    return len(schedule), spread, over_limit
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=30.0, help='time budget for optimal_assign (s)')
+    parser.add_argument('--max-slots', type=int, default=100_000)
+    parser.add_argument('--weekly-limit', type=int, default=5)
+    args = parser.parse_args()
+    
+    settings = dict(weekly_limit=args.weekly_limit)
+    print(f"{'slots':>7} {'mode':>8} {'assigned':>9} {'spread':>7} {'over-limit':>11} {'time':>8}")
+    for n_employees, n_stations, n_days in SCALES:
+        req_df, shi_df, dates = make_dataset(n_employees, n_stations, n_days, seed=1)
+        slots = len(shi_df) * len(dates)
+        if slots > args.max_slots:
+            continue
+        slot_table = scheduler_core.build_slot_table(dates, shi_df)
+        
+        for mode, solve in [
+            ('greedy', lambda: scheduler_core.auto_assign(dates, shi_df, req_df, {}, slots=slot_table, **settings)),
+            ('optimal', lambda: scheduler_core.optimal_assign(
+                dates, shi_df, req_df, {}, time_budget=args.budget, slots=slot_table, **settings)),
+        ]:
+            start = time.perf_counter()
+            schedule, _ = solve()
+            elapsed = time.perf_counter() - start
+            assigned, spread, over_limit = summarize(schedule, slot_table, args.weekly_limit)
+            print(f"{slots:>7} {mode:>8} {assigned:>9} {spread:>7} {over_limit:>11} {elapsed:>7.2f}s")
+
+if __name__ == '__main__':
+    main()
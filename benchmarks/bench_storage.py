@@ -0,0 +1,122 @@
+"""
+בנצ'מרק לשמירת מאזן ל-Database - מול תחליף Firestore מקומי עם השהיית רשת
+
+משווה את השמירה הקודמת (get לכל עובד, batch אחד, וקריאה חוזרת לסיכום)
+ל-FirestoreStorage ול-SQLiteStorage (קובץ זמני), ובודק שהסכומים שנכתבו זהים.
+בנוסף - קצב כתיבת רשומות משמרת (write_shifts) בטורי מול batches במקביל.
+
+הרצה:
+    python benchmarks/bench_storage.py [--latency 0.002] [--employees 1500] [--shifts 20000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from local_firestore import LocalFirestore  # noqa: E402
+
+def reference_save(db, employee_count):
+    """השמירה הקודמת - round trip לכל עובד, batch אחד ללא הגבלה"""
+    batch = db.batch()
+    for employee, current_shifts in employee_count.items():
+        doc_ref = db.collection('employees').document(employee)
+        existing_doc = doc_ref.get()
+        previous_total = 0
+        if existing_doc.exists:
+            previous_total = existing_doc.to_dict().get('total_shifts', 0)
+        batch.set(doc_ref, {'name': employee, 'total_shifts': previous_total + current_shifts})
+    batch.commit()
+    
+    return {
+        employee: (shifts, db.collection('employees').document(employee).get().to_dict()['total_shifts'])
+        for employee, shifts in employee_count.items()
+    }
+
+def existing_totals(n_employees):
+    """חצי מהעובדים כבר קיימים עם מאזן"""
+    return {f"עובד {i}": i % 7 for i in range(0, n_employees, 2)}
+
+def seeded_client(n_employees, latency):
+    db = LocalFirestore(latency=latency)
+    for name, total in existing_totals(n_employees).items():
+        db.write('employees', name, {'name': name, 'total_shifts': total}, merge=False)
+    return db
+
+def seeded_sqlite(n_employees, path):
+    store = storage.SQLiteStorage(path)
+    store.increment_balance(existing_totals(n_employees))
+    return store
+
+def bench_shift_writes(n_shifts, latency, tmp_dir):
+    """רשומות לשנייה - Firestore (מקומי) עם 1 / SHIFT_WRITE_WORKERS batches במקביל, ו-SQLite"""
+    slot_info = {
+        f"{i % 28 + 1:02d}/02/2026_תחנה {i % 40}_בוקר_{i}":
+            (f"{i % 28 + 1:02d}/02/2026", f"2026-02-{i % 28 + 1:02d}", f"תחנה {i % 40}", 'בוקר', i)
+        for i in range(n_shifts)
+    }
+    schedule = {key: f"עובד {i % 1500}" for i, key in enumerate(slot_info)}
+    records = storage.build_shift_records(schedule, set(), slot_info, '2026-02-01T00:00:00')
+    
+    print(f"\n{'records':>9} {'impl':>14} {'round trips':>12} {'time':>8} {'records/s':>10}")
+    for name, workers in [('firestore x1', 1), (f"firestore x{storage.SHIFT_WRITE_WORKERS}", storage.SHIFT_WRITE_WORKERS)]:
+        db = LocalFirestore(latency=latency)
+        start = time.perf_counter()
+        storage.FirestoreStorage(db).write_shifts(records, workers=workers)
+        storage.FirestoreStorage(db).write_shifts(records, workers=workers)  # שמירה חוזרת - דורסת
+        elapsed = time.perf_counter() - start
+        assert len(db.data['shifts']) == len(records)
+        print(f"{len(records):>9} {name:>14} {db.round_trips:>12} {elapsed:>7.2f}s {2 * len(records) / elapsed:>10.0f}")
+    
+    store = storage.SQLiteStorage(os.path.join(tmp_dir, 'bench_shifts.db'))
+    start = time.perf_counter()
+    store.write_shifts(records)
+    store.write_shifts(records)
+    elapsed = time.perf_counter() - start
+    print(f"{len(records):>9} {'sqlite':>14} {'-':>12} {elapsed:>7.2f}s {2 * len(records) / elapsed:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds per round trip')
+    parser.add_argument('--employees', type=int, nargs='+', default=[300, 1500, 5000])
+    parser.add_argument('--shifts', type=int, default=20000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'employees':>9} {'impl':>10} {'round trips':>12} {'time':>8}  result")
+        for n_employees in args.employees:
+            employee_count = {f"עובד {i}": 1 + i % 4 for i in range(n_employees)}
+            db = seeded_client(n_employees, args.latency)
+            sqlite_store = seeded_sqlite(n_employees, os.path.join(tmp_dir, f"bench_{n_employees}.db"))
+            implementations = [
+                ('reference', lambda: reference_save(db, employee_count), db),
+                ('firestore', lambda: storage.FirestoreStorage(db).increment_balance(employee_count), db),
+                ('sqlite', lambda: sqlite_store.increment_balance(employee_count), None),
+            ]
+            
+            results = {}
+            for name, save, client in implementations:
+                if client is not None:
+                    client.data = seeded_client(n_employees, 0).data
+                    client.round_trips = 0
+                start = time.perf_counter()
+                try:
+                    results[name] = save()
+                    status = "ok"
+                except ValueError as e:
+                    status = f"failed: {e}"
+                elapsed = time.perf_counter() - start
+                round_trips = client.round_trips if client is not None else '-'
+                print(f"{n_employees:>9} {name:>10} {round_trips:>12} {elapsed:>7.2f}s  {status}")
+            
+            if len({repr(sorted(result.items())) for result in results.values()}) > 1:
+                print("❌ הסכומים שנכתבו שונים")
+        
+        bench_shift_writes(args.shifts, args.latency * 10, tmp_dir)
+
+if __name__ == '__main__':
+    main()
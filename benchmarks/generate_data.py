@@ -0,0 +1,107 @@
+"""
+מחולל נתונים סינתטיים - קבצי בקשות ותבנית משמרות בפורמט שב-README
+
+הרצה:
+    python benchmarks/generate_data.py out_dir --employees 1500 --stations 10 --days 90
+"""
+
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+SHIFT_HOURS = {
+    'בוקר': ['08:00-16:00', '07:00-15:00', '06:00-14:00', '09:00-17:00'],
+    'ערב': ['15:00-23:00', '16:00-23:59', '14:00-22:00', '17:00-23:30'],
+    'לילה': ['00:00-08:00', '23:00-07:00', '22:00-06:00', '00:00-07:00'],
+}
+
+def make_dataset(n_employees, n_stations, n_days, seed=0, request_rate=0.5, atan_ratio=0.3,
+                 hours_variety=2, messy_ratio=0.0, start=date(2026, 2, 1)):
+    """בקשות + תבנית משמרות + רשימת תאריכים
+
+    hours_variety - כמה וריאציות שעות לכל סוג משמרת (1-4).
+    messy_ratio - חלק הבקשות עם רווחים / שעות הפוכות, כמו בקבצים אמיתיים.
+    """
+    rng = random.Random(seed)
+    hours = {shift: options[:max(1, min(hours_variety, len(options)))] for shift, options in SHIFT_HOURS.items()}
+    stations = [f'תחנה {i}' for i in range(n_stations)]
+    dates = [(start + timedelta(days=i)).strftime('%d/%m/%Y') for i in range(n_days)]
+    employees = [f'עובד {i}' for i in range(n_employees)]
+    atan = {e: 'כן' if rng.random() < atan_ratio else 'לא' for e in employees}
+    
+    requests = []
+    for emp in employees:
+        for d in dates:
+            if rng.random() < request_rate:
+                shift = rng.choice(list(hours))
+                shift_hours = rng.choice(hours[shift])
+                if rng.random() < messy_ratio:
+                    start_h, end_h = shift_hours.split('-')
+                    shift_hours = rng.choice([f"{start_h} - {end_h}", f"{end_h}-{start_h}"])
+                requests.append({
+                    'שם': emp, 'תאריך מבוקש': d, 'משמרת': shift,
+                    'תחנה': rng.choice(stations), 'שעות': shift_hours,
+                    'אט"ן': atan[emp],
+                })
+    
+    template = []
+    for station in stations:
+        for shift, options in hours.items():
+            for _ in range(rng.randint(1, 3)):
+                template.append({
+                    'משמרת': shift, 'תחנה': station,
+                    'סוג תקן': 'אט"ן' if rng.random() < 0.3 else 'רגיל',
+                    'שעות': options[0],
+                })
+    
+    columns = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה', 'שעות', 'אט"ן']
+    return pd.DataFrame(requests, columns=columns), pd.DataFrame(template), dates
+
+def make_balance(n_employees, seed=0, max_shifts=40):
+    """מאזן מצטבר בפורמט קובץ "ייצא עובדים" """
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'שם': [f'עובד {i}' for i in range(n_employees)],
+        'סה"כ משמרות': [rng.randint(0, max_shifts) for _ in range(n_employees)],
+    })
+
+def write_dataset(out_dir, n_employees, n_stations, n_days, seed=0, **kwargs):
+    """כתיבת requests.csv, shifts.csv, balance.csv - מחזיר את הנתיבים"""
+    os.makedirs(out_dir, exist_ok=True)
+    req_df, shi_df, _ = make_dataset(n_employees, n_stations, n_days, seed=seed, **kwargs)
+    paths = {
+        'requests': os.path.join(out_dir, 'requests.csv'),
+        'shifts': os.path.join(out_dir, 'shifts.csv'),
+        'balance': os.path.join(out_dir, 'balance.csv'),
+    }
+    req_df.to_csv(paths['requests'], index=False, encoding='utf-8-sig')
+    shi_df.to_csv(paths['shifts'], index=False, encoding='utf-8-sig')
+    make_balance(n_employees, seed=seed).to_csv(paths['balance'], index=False, encoding='utf-8-sig')
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="מחולל נתונים סינתטיים לשיבוץ")
+    parser.add_argument('out_dir')
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--stations', type=int, default=6)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--request-rate', type=float, default=0.5)
+    parser.add_argument('--atan-ratio', type=float, default=0.3)
+    parser.add_argument('--hours-variety', type=int, default=2)
+    parser.add_argument('--messy-ratio', type=float, default=0.05)
+    args = parser.parse_args()
+    
+    paths = write_dataset(
+        args.out_dir, args.employees, args.stations, args.days, seed=args.seed,
+        request_rate=args.request_rate, atan_ratio=args.atan_ratio,
+        hours_variety=args.hours_variety, messy_ratio=args.messy_ratio,
+    )
+    for path in paths.values():
+        print(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+תחליף מקומי ל-Firestore בזיכרון - לבדיקה ומדידה של קוד השמירה בלי ענן
+
+תומך בחלק של הממשק שהאפליקציה משתמשת בו: collection / document /
+get / set (כולל merge ו-Increment) / stream / get_all / batch (set, create, delete),
+ושאילתות where /
+order_by / select / limit / start_after. כל פנייה "לשרת" נספרת
+ב-round_trips ומשהה latency שניות, כדי לדמות רשת. בטוח לשימוש
+מכמה threads (כתיבות batch במקביל).
+"""
+
+import operator
+import threading
+import time
+
+from storage import AlreadyExists, Increment
+
+OPERATORS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+    
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class DocumentRef:
+    def __init__(self, client, collection, doc_id):
+        self._client, self._collection, self.id = client, collection, doc_id
+    
+    def get(self):
+        self._client.round_trip()
+        return self._client.snapshot(self._collection, self.id)
+    
+    def set(self, data, merge=False):
+        self._client.round_trip()
+        self._client.write(self._collection, self.id, data, merge)
+
+class Query:
+    """שאילתה בלתי ניתנת לשינוי - כל מתודה מחזירה עותק, כמו ב-Firestore"""
+    
+    DESCENDING = 'DESCENDING'
+    
+    def __init__(self, client, name, filters=(), orders=(), fields=None, limit=None, cursor=None):
+        self._client, self._name = client, name
+        self._filters, self._orders = filters, orders
+        self._fields, self._limit, self._cursor = fields, limit, cursor
+    
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, fields=self._fields,
+                     limit=self._limit, cursor=self._cursor)
+        state.update(changes)
+        return Query(self._client, self._name, **state)
+    
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, OPERATORS[op], value),))
+    
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction == self.DESCENDING),))
+    
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+    
+    def limit(self, count):
+        return self._copy(limit=count)
+    
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+    
+    def _sort_key(self, doc_id, data):
+        return [data.get(field) if field != '__name__' else doc_id for field, _ in self._orders]
+    
+    def _cursor_position(self, rows):
+        """המקום אחרי הסמן - לפי ערכי שדות המיון בנתוני הסמן, כמו ב-Firestore
+
+        הסמן הוא snapshot מהדף הקודם, עם השדות שנבחרו ב-select בלבד - שדה
+        מיון שלא נבחר לא נמצא בו, ו-Firestore נכשל (ValueError).
+        """
+        data = self._cursor.to_dict() or {}
+        missing = [field for field, _ in self._orders if field != '__name__' and field not in data]
+        if missing:
+            raise ValueError(f"cursor snapshot has no value for order_by field(s) {missing}")
+        cursor_key = self._sort_key(self._cursor.id, data)
+        
+        def after_cursor(doc_id, row_data):
+            row_key = self._sort_key(doc_id, row_data)
+            for (_, descending), value, cursor_value in zip(self._orders, row_key, cursor_key):
+                if value != cursor_value:
+                    return value < cursor_value if descending else value > cursor_value
+            return doc_id > self._cursor.id
+        
+        return next((i for i, row in enumerate(rows) if after_cursor(*row)), len(rows))
+    
+    def stream(self):
+        self._client.round_trip()
+        docs = self._client.data.get(self._name, {})
+        order_fields = [field for field, _ in self._orders if field != '__name__']
+        rows = [
+            (doc_id, data) for doc_id, data in docs.items()
+            if all(field in data and test(data[field], value) for field, test, value in self._filters)
+            and all(field in data for field in order_fields)
+        ]
+        
+        # מיון יציב מהמפתח האחרון לראשון; __name__ תמיד שובר שוויון
+        rows.sort(key=lambda row: row[0])
+        for i in reversed(range(len(self._orders))):
+            field, descending = self._orders[i]
+            rows.sort(key=lambda row: self._sort_key(*row)[i], reverse=descending)
+        
+        if self._cursor is not None:
+            rows = rows[self._cursor_position(rows):]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._fields is not None:
+            rows = [(doc_id, {f: data[f] for f in self._fields if f in data}) for doc_id, data in rows]
+        return [Snapshot(doc_id, data) for doc_id, data in rows]
+
+class CollectionRef(Query):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+    
+    def document(self, doc_id):
+        return DocumentRef(self._client, self._name, doc_id)
+
+class WriteBatch:
+    MAX_OPERATIONS = 500
+    
+    def __init__(self, client):
+        self._client, self._ops = client, []
+    
+    def set(self, doc_ref, data, merge=False):
+        self._ops.append((doc_ref, data, merge, False))
+    
+    def create(self, doc_ref, data):
+        self._ops.append((doc_ref, data, False, True))
+    
+    def delete(self, doc_ref):
+        self._ops.append((doc_ref, None, False, False))
+    
+    def commit(self):
+        if len(self._ops) > self.MAX_OPERATIONS:
+            raise ValueError(f"batch of {len(self._ops)} writes exceeds {self.MAX_OPERATIONS}")
+        self._client.round_trip()
+        with self._client.lock:
+            # create על מסמך קיים - אף פעולה לא מוחלת
+            for doc_ref, _, _, create in self._ops:
+                if create and self._client.snapshot(doc_ref._collection, doc_ref.id).exists:
+                    self._ops = []
+                    raise AlreadyExists(f"{doc_ref._collection}/{doc_ref.id}")
+            for doc_ref, data, merge, _ in self._ops:
+                if data is None:
+                    self._client.data.get(doc_ref._collection, {}).pop(doc_ref.id, None)
+                else:
+                    self._client.write(doc_ref._collection, doc_ref.id, data, merge)
+        self._ops = []
+
+class LocalFirestore:
+    """לקוח Firestore מדומה - data: {אוסף: {מזהה מסמך: dict}}"""
+    
+    def __init__(self, latency=0.0):
+        self.data = {}
+        self.latency = latency
+        self.round_trips = 0
+        self.lock = threading.Lock()
+    
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def snapshot(self, collection, doc_id):
+        return Snapshot(doc_id, self.data.get(collection, {}).get(doc_id))
+    
+    def write(self, collection, doc_id, data, merge):
+        docs = self.data.setdefault(collection, {})
+        previous = docs.get(doc_id, {}) if merge else {}
+        data = {
+            field: previous.get(field, 0) + value.value if isinstance(value, Increment) else value
+            for field, value in data.items()
+        }
+        docs[doc_id] = {**previous, **data}
+    
+    def collection(self, name):
+        return CollectionRef(self, name)
+    
+    def batch(self):
+        return WriteBatch(self)
+    
+    def get_all(self, refs):
+        self.round_trip()
+        return [self.snapshot(ref._collection, ref.id) for ref in refs]
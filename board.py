@@ -0,0 +1,152 @@
+"""
+לוח שיבוץ - רכיב HTML אחד לשבוע
+
+כל רשת השבוע נשלחת כ-payload אחד במקום st.columns + st.markdown + 2-3
+st.button לכל תא. לחיצה על כפתור בתא חוזרת לפייתון בערוץ אירועים אחד
+(setTriggerValue): {'action': 'assign' | 'delete' | 'cancel' | 'restore',
+'slot': slot_id מטבלת המשבצות}. העיצוב נשאר בקלאסים הקיימים (shift-card, morning /
+evening / night, assigned / empty / cancelled) - הרכיב לא מבודד ב-shadow
+DOM, כך שה-CSS של האפליקציה חל עליו.
+"""
+
+import html
+
+import streamlit as st
+
+BOARD_CSS = """
+.board-grid {
+    display: grid;
+    grid-template-columns: repeat(7, minmax(0, 1fr));
+    gap: 0 1rem;
+    direction: rtl;
+}
+
+.board-actions {
+    display: flex;
+    gap: 0.25rem;
+    margin: -0.5rem 0 0.75rem 0;
+}
+
+.board-action {
+    flex: 1;
+    border: 1px solid rgba(49, 51, 63, 0.2);
+    border-radius: 8px;
+    background: white;
+    font-weight: 600;
+    padding: 0.25rem 0.5rem;
+    cursor: pointer;
+    transition: all 0.3s;
+}
+
+.board-action.secondary {
+    flex: 0 0 auto;
+}
+
+.board-action:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 12px rgba(0,0,0,0.15);
+}
+"""
+
+# מחליף את תוכן הלוח בכל עדכון נתונים; מאזין לחיצות אחד לכל הלוח
+BOARD_JS = """
+export default function(component) {
+    const { data, setTriggerValue, parentElement } = component;
+    let root = parentElement.querySelector('.shift-board');
+    if (!root) {
+        root = document.createElement('div');
+        root.className = 'shift-board';
+        parentElement.appendChild(root);
+        root.addEventListener('click', (event) => {
+            const button = event.target.closest('button[data-action]');
+            if (button) {
+                root.sendAction({ action: button.dataset.action, slot: button.dataset.slot });
+            }
+        });
+    }
+    root.sendAction = (value) => setTriggerValue('action', value);
+    root.innerHTML = data.html;
+}
+"""
+
+board_component = st.components.v2.component(
+    "shift_board", css=BOARD_CSS, js=BOARD_JS, isolate_styles=False
+)
+
+def action_button(action, slot_id, label, secondary=False):
+    css = "board-action secondary" if secondary else "board-action"
+    return f'<button class="{css}" data-action="{action}" data-slot="{slot_id}">{label}</button>'
+
+def render_cell(slot_id, station, shift_type, shift_kind, css, is_atan, employee=None, cancelled=False):
+    """כרטיס משבצת + כפתורי הפעולה שלה"""
+    status = "cancelled" if cancelled else "assigned" if employee is not None else "empty"
+    atan_badge = " 🔒" if is_atan else ""
+    badge = {'cancelled': "מבוטל", 'assigned': "✓", 'empty': "ריק"}[status]
+    employee_line = f'<div class="shift-employee">{html.escape(str(employee))}</div>' if employee is not None else ""
+    
+    if status == "cancelled":
+        actions = action_button("restore", slot_id, "🔄")
+    elif status == "assigned":
+        actions = action_button("delete", slot_id, "🗑️") + action_button("cancel", slot_id, "🚫", True)
+    else:
+        actions = action_button("assign", slot_id, "➕ שבץ") + action_button("cancel", slot_id, "🚫", True)
+    
+    return f'''<div>
+        <div class="shift-card {status} {css}">
+            <div class="shift-header">
+                <span class="shift-title">{html.escape(str(shift_type))}{atan_badge}</span>
+                <span class="status-badge status-{status}">{badge}</span>
+            </div>
+            {employee_line}
+            <div class="shift-station" style="font-size: 0.85rem;">{html.escape(str(station))} • {html.escape(str(shift_kind))}</div>
+        </div>
+        <div class="board-actions">{actions}</div>
+    </div>'''
+
+def build_board_html(week_slots, schedule, cancelled):
+    """HTML של רשת השבוע - כותרות ימים ושורה לכל שורת תבנית
+    
+    week_slots: שורות השבוע מטבלת המשבצות (scheduler_core.build_slot_table) -
+    לפי תאריך, ובתוך כל תאריך לפי סדר התבנית.
+    """
+    week_dates = list(dict.fromkeys(week_slots['date'].tolist()))
+    day_names = dict(zip(week_slots['date'].tolist(), week_slots['day'].tolist()))
+    cells = [f'''<div class="day-header">
+            <span class="day-name">{html.escape(day_names[date_str])}</span>
+            <span class="day-date">{html.escape(date_str)}</span>
+        </div>''' for date_str in week_dates]
+    cells.extend('<div></div>' for _ in range(7 - len(week_dates)))
+    if not week_dates:
+        return f'<div class="board-grid">{"".join(cells)}</div>'
+    
+    records = list(zip(
+        week_slots.index.tolist(), week_slots['key'].tolist(), week_slots['station'].tolist(),
+        week_slots['shift'].tolist(), week_slots['kind'].tolist(), week_slots['css'].tolist(),
+        week_slots['atan'].tolist(),
+    ))
+    rows_per_date = len(records) // len(week_dates)
+    for row in range(rows_per_date):
+        for day in range(len(week_dates)):
+            slot_id, slot_key, station, shift_type, shift_kind, css, is_atan = records[day * rows_per_date + row]
+            cells.append(render_cell(
+                slot_id, station, shift_type, shift_kind, css, is_atan,
+                employee=schedule.get(slot_key), cancelled=slot_key in cancelled
+            ))
+        cells.extend('<div></div>' for _ in range(7 - len(week_dates)))
+    
+    return f'<div class="board-grid">{"".join(cells)}</div>'
+
+def render_board(week_slots, schedule, cancelled, key='board'):
+    """מציג את הלוח ומחזיר (פעולה, slot_id) מלחיצה בשבוע המוצג, או None"""
+    board_html = build_board_html(week_slots, schedule, cancelled)
+    result = board_component(key=key, data={'html': board_html}, on_action_change=lambda: None)
+    event = result.action
+    if not event:
+        return None
+    try:
+        slot_id = int(event.get('slot'))
+    except (TypeError, ValueError):
+        return None
+    if slot_id not in week_slots.index:
+        return None
+    return event.get('action'), slot_id
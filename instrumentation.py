@@ -0,0 +1,65 @@
+"""
+מדידת ביצועים לפי שלב - זמן קיר ומספר קריאות בכל ריצה של הסקריפט
+"""
+
+import json
+import time
+from contextlib import nullcontext
+
+# הקשר ריק משותף - כשהמדידה כבויה phase() לא מקצה כלום
+_NULL_PHASE = nullcontext()
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'start')
+    
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class PhaseTimer:
+    """צובר זמן קיר ומספר קריאות לכל שלב
+
+    שימוש:
+        timer = PhaseTimer(enabled=True)
+        with timer.phase('read_csv'):
+            ...
+    """
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = {}
+    
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+    
+    def add(self, name, elapsed):
+        total, calls = self.phases.get(name, (0.0, 0))
+        self.phases[name] = (total + elapsed, calls + 1)
+    
+    def summary(self):
+        """שלבים לפי סדר הופעה: [{'phase', 'ms', 'calls'}]"""
+        return [
+            {'phase': name, 'ms': round(total * 1000, 2), 'calls': calls}
+            for name, (total, calls) in self.phases.items()
+        ]
+    
+    def total_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
+    
+    def log(self, logger, **extra):
+        """שורת לוג JSON אחת לריצה"""
+        if not self.enabled:
+            return
+        record = {'event': 'rerun_timing', 'total_ms': self.total_ms(), 'phases': self.summary(), **extra}
+        logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,125 @@
+"""
+שמירה ברקע (write-behind) - ללא Streamlit
+
+הממשק מעביר תמונת מצב של השיבוץ וחוזר מיד; thread רקע כותב אותה
+לאחסון - רשומה לכל משבצת ב-shifts ותוספת ל-total_shifts - עם ניסיונות
+חוזרים ו-backoff מעריכי. כל שמירה מזוהה בטוקן גרסה (hash של השיבוץ),
+ולכן ניסיון חוזר - או לחיצה כפולה - לא מוסיף משמרות פעמיים למאזן.
+"""
+
+import hashlib
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+from storage import build_shift_deletions, build_shift_records, count_by_employee
+
+logger = logging.getLogger(__name__)
+
+QUEUED, SAVING, RETRYING, SAVED, FAILED = 'queued', 'saving', 'retrying', 'saved', 'failed'
+
+def schedule_token(schedule, cancelled=(), horizon=()):
+    """טוקן גרסה לשיבוץ - זהה לכל שיבוץ עם אותן משבצות, עובדים, ביטולים ואופק
+    
+    horizon - מפתחות כל המשבצות בשמירה; משבצת ריקה בהן נמחקת מ-shifts,
+    ולכן אופק אחר הוא שמירה אחרת גם כשהשיבוץ זהה.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for shift_key, employee in sorted(schedule.items()):
+        digest.update(f"{shift_key}\x1f{employee}\x1e".encode('utf-8'))
+    for shift_key in sorted(cancelled):
+        digest.update(f"{shift_key}\x1f\x1e".encode('utf-8'))
+    for shift_key in sorted(horizon):
+        digest.update(f"{shift_key}\x1d".encode('utf-8'))
+    return digest.hexdigest()
+
+class PersistenceWorker:
+    """תור שמירות ו-thread רקע אחד שמבצע אותן לפי הסדר
+    
+    status(token) מחזיר dict: state, attempts, error, written, updated_at.
+    on_saved(job) נקרא מה-thread אחרי שמירה מוצלחת (למשל לניקוי מטמון).
+    """
+    
+    def __init__(self, store, max_attempts=5, base_delay=0.5, max_delay=30.0, on_saved=None):
+        self.store = store
+        self.max_attempts = max_attempts
+        self.base_delay, self.max_delay = base_delay, max_delay
+        self.on_saved = on_saved
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='persistence-worker', daemon=True)
+        self._thread.start()
+    
+    def submit(self, schedule, cancelled=(), slot_info=None):
+        """הכנסת תמונת מצב לתור - מחזיר את טוקן הגרסה מיד
+        
+        גרסה שכבר בתור, בשמירה או נשמרה לא נשלחת שוב.
+        slot_info: מפתח משבצת -> (תאריך, YYYY-MM-DD, תחנה, משמרת, שורה) לכל
+        משבצות האופק - למשובצות ולמבוטלות נכתבת רשומה (storage.build_shift_records),
+        ומסמכי השאר נמחקים (storage.build_shift_deletions).
+        """
+        snapshot = dict(schedule)
+        cancelled = frozenset(cancelled)
+        token = schedule_token(snapshot, cancelled, slot_info or ())
+        with self._lock:
+            job = self._jobs.get(token)
+            if job and job['state'] != FAILED:
+                return token
+            self._jobs[token] = {
+                'token': token, 'state': QUEUED, 'attempts': 0, 'error': None,
+                'written': None, 'updated_at': time.time(), 'shifts': len(snapshot),
+            }
+        self._queue.put((token, snapshot, cancelled, dict(slot_info or {})))
+        return token
+    
+    def status(self, token):
+        with self._lock:
+            job = self._jobs.get(token)
+            return dict(job) if job else None
+    
+    def _update(self, token, **changes):
+        with self._lock:
+            self._jobs[token].update(changes, updated_at=time.time())
+    
+    def _backoff(self, attempt):
+        """השהיה לפני ניסיון attempt+1: base * 2^(attempt-1) עם jitter, עד max_delay"""
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _run(self):
+        while True:
+            token, snapshot, cancelled, slot_info = self._queue.get()
+            employee_count = count_by_employee(snapshot)
+            # המאזן תלוי רק במשובצים - ביטול נוסף לא יוצר תוספת חדשה
+            balance_token = schedule_token(snapshot)
+            records = build_shift_records(snapshot, cancelled, slot_info,
+                                          datetime.now().isoformat(timespec='seconds'))
+            deleted = build_shift_deletions(snapshot, cancelled, slot_info)
+            for attempt in range(1, self.max_attempts + 1):
+                self._update(token, state=SAVING, attempts=attempt)
+                try:
+                    # רשומות המשמרות במזהים קבועים - ניסיון חוזר דורס אותן (ומוחק שוב)
+                    self.store.write_shifts(records, deleted)
+                    written = self.store.increment_balance(employee_count, save_token=balance_token)
+                except Exception as e:
+                    logger.warning(f"⚠️ שמירה {token[:8]} נכשלה (ניסיון {attempt}/{self.max_attempts}): {e}")
+                    if attempt == self.max_attempts:
+                        self._update(token, state=FAILED, error=str(e))
+                    else:
+                        self._update(token, state=RETRYING, error=str(e))
+                        time.sleep(self._backoff(attempt))
+                    continue
+                
+                self._update(token, state=SAVED, error=None, written=written)
+                logger.info(f"✅ שמירה {token[:8]}: {len(records)} משמרות, {len(written)} עובדים")
+                if self.on_saved:
+                    try:
+                        self.on_saved(self.status(token))
+                    except Exception as e:
+                        logger.warning(f"⚠️ on_saved: {e}")
+                break
+            self._queue.task_done()
@@ -0,0 +1,876 @@
+"""
+מנוע השיבוץ - ללא Streamlit
+
+קליטת קבצים, טבלת תאריכים ומשבצות, שיבוץ (חמדני / אופטימלי / השלמה מקומית),
+ייצוא ודוח חוסרים. ההגדרות (מכסה שבועית, בדיקת שעות, משבצות מבוטלות)
+מועברות כפרמטרים, כך שאפשר להריץ מ-batch, מבדיקות או משורת הפקודה:
+
+    python scheduler_core.py requests.csv shifts.csv -o schedule.csv
+"""
+
+import argparse
+import hashlib
+import heapq
+import io
+import logging
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import xlsxwriter
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# קבועים
+REQUIRED_REQUEST_COLUMNS = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה']
+REQUIRED_SHIFT_COLUMNS = ['משמרת', 'תחנה', 'סוג תקן']  # סדר מדויק כמו בקובץ
+OPTIONAL_SHIFT_COLUMNS = ['שעות', 'תפקיד']  # עמודות אופציונליות
+DAYS_HEB = {
+    'Sunday': 'ראשון', 'Monday': 'שני', 'Tuesday': 'שלישי',
+    'Wednesday': 'רביעי', 'Thursday': 'חמישי', 'Friday': 'שישי', 'Saturday': 'שבת'
+}
+DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y']
+TIME_COLUMN_MARKERS = ('שע', 'זמן', 'hour', 'time')
+HOURS_PATTERN = re.compile(r'^(\d{1,2})(?::(\d{2}))?-(\d{1,2})(?::(\d{2}))?$')
+HOURS_KEY_COLUMN = 'span_key'  # מפתח השעות מהקליטה - בלי סמן של get_time_columns
+DEFAULT_WEEKLY_LIMIT = 5
+EXPORT_COLUMNS = ['תאריך', 'יום', 'שעות', 'משמרת', 'תחנה משובצת', 'תחנה מבוקשת',
+                  'סוג תקן', 'שם עובד', 'מאזן משמרות', 'סטטוס']
+EXPORT_FORMATS = {  # פורמט -> mime
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+MISSING_COLUMNS = ['תאריך', 'יום', 'תחנה', 'משמרת', 'סוג תקן', 'סיבה']
+CATEGORY_COLUMNS = REQUIRED_REQUEST_COLUMNS  # עמודות חוזרות שנשמרות כקודים
+CANDIDATE_KEY_COLUMNS = ['תאריך מבוקש', 'משמרת', 'תחנה']
+SLOT_CATEGORY_COLUMNS = ['date', 'date_iso', 'week', 'day', 'station', 'shift', 'kind', 'css']
+
+def build_date_dimension(date_values):
+    """טבלת תאריכים - כל מחרוזת תאריך ייחודית מפוענחת פעם אחת
+
+    אינדקס: מחרוזת התאריך המקורית (לפי סדר הופעה).
+    עמודות: date (datetime64), week (ראשון של השבוע), day (שם יום בעברית).
+    """
+    raw = pd.Index(pd.unique(pd.Series(date_values, dtype=object).dropna()), dtype=object)
+    parsed = pd.Series(pd.NaT, index=raw, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        missing = parsed.isna().to_numpy()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(raw[missing].astype(str), format=fmt, errors='coerce')
+    for date_str in raw[parsed.isna().to_numpy()]:
+        try:
+            parsed[date_str] = pd.to_datetime(date_str)
+        except (ValueError, TypeError):
+            pass
+    
+    sunday = parsed - pd.to_timedelta((parsed.dt.weekday + 1) % 7, unit='D')
+    week = sunday.dt.strftime('%Y-%m-%d').where(parsed.notna(), pd.Series(raw, index=raw))
+    day = parsed.dt.day_name().map(DAYS_HEB).fillna("")
+    return pd.DataFrame({'date': parsed, 'week': week, 'day': day}, index=raw)
+
+def sort_dates(date_dim):
+    """מחרוזות התאריכים ממוינות כרונולוגית"""
+    return date_dim.sort_values('date', kind='stable').index.tolist()
+
+def parse_date_safe(date_str, date_dim=None):
+    """המרת תאריך מחוזקת"""
+    if date_dim is None:
+        date_dim = build_date_dimension([date_str])
+    parsed = date_dim['date'].get(date_str)
+    return None if parsed is None or pd.isna(parsed) else parsed
+
+def get_day_name(date_str, date_dim=None):
+    """קבלת שם יום בעברית"""
+    if date_dim is None:
+        date_dim = build_date_dimension([date_str])
+    return date_dim['day'].get(date_str, "")
+
+def get_week_start(date_str, date_dim=None):
+    """מחזיר תאריך ראשון של השבוע"""
+    if date_dim is None:
+        date_dim = build_date_dimension([date_str])
+    return date_dim['week'].get(date_str, date_str)
+
+def group_dates_by_week(dates, date_dim=None):
+    """{מפתח שבוע: תאריכי השבוע} - לפי סדר dates"""
+    if date_dim is None:
+        date_dim = build_date_dimension(dates)
+    week_keys = date_dim['week'].to_dict()
+    weeks = {}
+    for date_str in dates:
+        weeks.setdefault(week_keys.get(date_str, date_str), []).append(date_str)
+    return weeks
+
+def validate_dataframes(req_df, shi_df):
+    """בדיקת תקינות קבצים - רק בדיקת קיום עמודות, לא סדר"""
+    errors = []
+    
+    # בדיקת קובץ בקשות - רק שהעמודות קיימות
+    missing_req = set(REQUIRED_REQUEST_COLUMNS) - set(req_df.columns)
+    if missing_req:
+        errors.append(f"❌ עמודות חסרות בקובץ בקשות: {', '.join(missing_req)}")
+    
+    # בדיקת קובץ משמרות - רק שהעמודות קיימות
+    missing_shi = set(REQUIRED_SHIFT_COLUMNS) - set(shi_df.columns)
+    if missing_shi:
+        errors.append(f"❌ עמודות חסרות בתבנית משמרות: {', '.join(missing_shi)}")
+    
+    return errors
+
+def get_atan_column(df):
+    """מציאת עמודת אט"ן - תומך בשמות שונים"""
+    # רשימת שמות אפשריים
+    possible_names = ['אטן', 'אט"ן', 'אט״ן', 'אטען', 'atan', 'מורשה']
+    
+    for col in df.columns:
+        col_lower = col.lower().strip()
+        # בדוק אם יש התאמה חלקית
+        if any(name in col_lower for name in possible_names):
+            return col
+        # בדוק אם יש אט בעמודה
+        if 'אט' in col:
+            return col
+    
+    return None
+
+def get_time_columns(df):
+    """עמודות שעות - תומך בשמות שונים"""
+    return [c for c in df.columns if any(marker in c.lower() for marker in TIME_COLUMN_MARKERS)]
+
+def parse_hours(hours_str):
+    """'08:00-16:00' -> (480, 960) בדקות מתחילת היום, None אם לא ניתן לפענח"""
+    match = HOURS_PATTERN.match(hours_str)
+    if not match:
+        return None
+    start_h, start_m, end_h, end_m = match.groups()
+    return int(start_h) * 60 + int(start_m or 0), int(end_h) * 60 + int(end_m or 0)
+
+def fix_time_format(time_str):
+    """תיקון שעות הפוכות (23:00-15:00 -> 15:00-23:00)"""
+    if '-' in time_str:
+        parts = time_str.split('-')
+        if len(parts) == 2:
+            start, end = parts[0].strip(), parts[1].strip()
+            # אם השעה מתחילה אחרי שהיא מסתיימת, החלף
+            try:
+                if int(start.split(':')[0]) > int(end.split(':')[0]):
+                    return f"{end}-{start}"
+            except ValueError:
+                pass
+    return time_str
+
+def normalize_hours(df, df_name):
+    """ניקוי ותיקון עמודות שעות פעם אחת בקליטה + עמודת מפתח שעות מספרי
+
+    עובד על הערכים הייחודיים בלבד ומפיץ חזרה לפי קודים, ומוסיף מעמודת
+    השעות הראשונה את span_key (hours_keys) - המנועים קוראים אותו ולא מפענחים שוב.
+    מחזיר רשימת תיקונים שבוצעו.
+    """
+    corrections = []
+    for i, col in enumerate(get_time_columns(df)):
+        codes, uniques = pd.factorize(df[col])
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        
+        # נקה רווחים ותקן שעות הפוכות
+        cleaned = [str(v).replace(' ', '') for v in uniques]
+        fixed = [fix_time_format(v) for v in cleaned]
+        if any(' ' in str(v) for v in uniques):
+            corrections.append(f"נוקו רווחים מעמודת שעות בקובץ {df_name}")
+        fixed_count = int(sum(n for n, before, after in zip(counts, cleaned, fixed) if before != after))
+        if fixed_count > 0:
+            corrections.append(f"תוקנו {fixed_count} שעות הפוכות בקובץ {df_name}")
+        
+        df[col] = np.array(fixed + [np.nan], dtype=object)[codes]
+        if i == 0:
+            df[HOURS_KEY_COLUMN] = hours_keys(df[col])
+            unparsed = int(sum(n for n, v in zip(counts, fixed) if v and parse_hours(v) is None))
+            if unparsed > 0:
+                corrections.append(f"{unparsed} ערכי שעות בקובץ {df_name} לא בפורמט HH:MM-HH:MM - יושוו כטקסט")
+    return corrections
+
+def intern_columns(df, columns):
+    """עמודות טקסט חוזרות -> category: קוד מספרי לשורה + מילון ערכים אחד
+
+    השוואות (==, isin) ו-groupby עובדות על הקודים, והערכים חוזרים
+    כמחרוזות רק בתצוגה ובייצוא.
+    """
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+def hours_text_key(text):
+    """מפתח שלילי (קטן מ-1-) לשעות שלא מתפענחות - קבוע לאותו טקסט בשני הקבצים"""
+    return -2 - int.from_bytes(hashlib.blake2b(text.encode(), digest_size=6).digest(), 'big')
+
+def hours_keys(values):
+    """עמודת שעות -> מפתח מספרי לכל שורה (int64), -1 אם אין שעות
+
+    שעות בפורמט HH:MM-HH:MM - התחלה * 2048 + סיום בדקות, כך ש-8-16 ו-08:00-16:00
+    שווים. ערך שלא מתפענח מושווה כטקסט (בלי רווחים), כמו לפני הפענוח.
+    """
+    codes, uniques = pd.factorize(values)
+    keys = []
+    for value in uniques:
+        text = str(value).strip().replace(' ', '')
+        parsed = parse_hours(text)
+        if parsed:
+            keys.append(parsed[0] * 2048 + parsed[1])
+        else:
+            keys.append(hours_text_key(text) if text else -1)
+    return np.array(keys + [-1], dtype=np.int64)[codes]
+
+def get_hours_keys(df):
+    """מפתחות השעות של השורות כרשימה - מעמודת span_key של הקליטה אם קיימת"""
+    if HOURS_KEY_COLUMN in df.columns:
+        return df[HOURS_KEY_COLUMN].tolist()
+    time_cols = get_time_columns(df)
+    if not time_cols:
+        return [-1] * len(df)
+    return hours_keys(df[time_cols[0]]).tolist()
+
+def shift_css_class(shift_type):
+    """קלאס צבע לפי סוג משמרת"""
+    shift_name = str(shift_type).lower()
+    if 'בוקר' in shift_name:
+        return "morning"
+    if 'ערב' in shift_name:
+        return "evening"
+    if 'לילה' in shift_name:
+        return "night"
+    return ""
+
+def make_slot_key(date_str, station, shift_type, idx):
+    """מפתח משבצת - המזהה בשיבוץ, בטוקן השמירה ובמזהה המסמך"""
+    return f"{date_str}_{station}_{shift_type}_{idx}"
+
+def build_slot_table(dates, shi_df, date_dim=None):
+    """טבלת משבצות - שורה לכל (תאריך, שורת תבנית), פעם אחת לכל העלאה
+
+    אינדקס: slot_id - לפי סדר dates, ובתוך כל תאריך לפי סדר התבנית.
+    עמודות: key, date, date_iso, date_value, week, day, row (אינדקס בתבנית),
+    station, shift, kind (סוג תקן), css, atan, hours (get_hours_keys, -1 אם אין).
+    המנוע, הלוח, הייצוא ודוח החוסרים קוראים מכאן במקום לבנות ולפרק מפתחות.
+    """
+    if date_dim is None:
+        date_dim = build_date_dimension(dates)
+    n_dates, n_rows = len(dates), len(shi_df)
+    day_pos = np.repeat(np.arange(n_dates), n_rows)
+    row_pos = np.tile(np.arange(n_rows), n_dates)
+    
+    # תכונות לכל תאריך ולכל שורת תבנית - ואז פריסה למשבצות
+    dim = date_dim.reindex(dates)
+    date_strs = np.asarray(dates, dtype=object)
+    per_date = {
+        'date': date_strs,
+        'date_iso': np.where(dim['date'].notna(), dim['date'].dt.strftime('%Y-%m-%d'), date_strs),
+        'date_value': dim['date'].to_numpy(),
+        'week': dim['week'].fillna(pd.Series(date_strs, index=dim.index)).to_numpy(dtype=object),
+        'day': dim['day'].fillna("").to_numpy(dtype=object),
+    }
+    per_row = {
+        'row': shi_df.index.to_numpy(),
+        'station': shi_df['תחנה'].to_numpy(dtype=object),
+        'shift': shi_df['משמרת'].to_numpy(dtype=object),
+        'kind': shi_df['סוג תקן'].to_numpy(dtype=object),
+        'css': np.array([shift_css_class(t) for t in shi_df['משמרת']], dtype=object),
+        'atan': np.array(["אט" in str(t) for t in shi_df['סוג תקן']], dtype=bool),
+        'hours': np.array(get_hours_keys(shi_df), dtype=np.int64),
+    }
+    
+    columns = {
+        **{col: values[day_pos] for col, values in per_date.items()},
+        **{col: values[row_pos] for col, values in per_row.items()},
+    }
+    keys = [make_slot_key(*parts) for parts in zip(
+        columns['date'].tolist(), columns['station'].tolist(), columns['shift'].tolist(), columns['row'].tolist()
+    )]
+    slots = pd.DataFrame({'key': keys, **columns})
+    intern_columns(slots, SLOT_CATEGORY_COLUMNS)
+    slots.index.name = 'slot_id'
+    return slots
+
+def slot_records(slots, columns):
+    """שורות הטבלה כ-tuples של ערכי פייתון, לפי סדר slot_id"""
+    return zip(*(slots[col].tolist() for col in columns))
+
+def slot_rows(slots, keys):
+    """שורות המשבצות של מפתחות השיבוץ, לפי הסדר - מפתח לא מוכר מושמט"""
+    positions = pd.Index(slots['key']).get_indexer(list(keys))
+    return slots.iloc[positions[positions >= 0]]
+
+def build_candidate_index(req_df, columns=CANDIDATE_KEY_COLUMNS):
+    """אינדקס מועמדים: (תאריך, משמרת, תחנה) -> מיקומי שורות בסדר הקובץ
+
+    מקבץ לפי קודי העמודות (מפתח int64 אחד ומיון יציב) ולא לפי tuples
+    של מחרוזות; הערכים חוזרים למחרוזות רק במפתחות המילון.
+    columns - עמודות המפתח, למשל רק (תאריך, משמרת) לדיאלוג השיבוץ הידני.
+    """
+    if req_df.empty:
+        return {}
+    key = np.zeros(len(req_df), dtype=np.int64)
+    valid = np.ones(len(req_df), dtype=bool)
+    values = []
+    for col in columns:
+        codes, uniques = pd.factorize(req_df[col])
+        key = key * (len(uniques) + 1) + codes
+        valid &= codes >= 0
+        values.append((codes, np.asarray(uniques, dtype=object)))
+    
+    positions = np.flatnonzero(valid)
+    if not len(positions):
+        return {}
+    positions = positions[np.argsort(key[positions], kind='stable')]
+    bounds = np.flatnonzero(np.diff(key[positions])) + 1
+    firsts = positions[np.r_[0, bounds]]
+    keys = zip(*(uniques[codes[firsts]].tolist() for codes, uniques in values))
+    return {k: group.tolist() for k, group in zip(keys, np.split(positions, bounds))}
+
+class CandidatePool:
+    """מועמדים למשבצת בערימות לפי (מאזן, סדר בקובץ)
+
+    מאזן ומכסה שבועית של עובד משתנים רק כשהוא משובץ, ואז הוא יוצא מכל
+    המשבצות של אותו יום. לכן הערימות נבנות בפעם הראשונה שהמשבצת נדרשת
+    באותו יום, ועובדים משובצים מוסרים מראש הערימה בעצלות - O(log n).
+    """
+    
+    def __init__(self, entries, under_limit, atan_ok):
+        # entries: (מאזן, מיקום שורה, מזהה עובד)
+        self.under = [e for e in entries if e[2] in under_limit]
+        self.over = [e for e in entries if e[2] not in under_limit]
+        self.under_atan = [e for e in self.under if atan_ok[e[1]]]
+        self.over_atan = [e for e in self.over if atan_ok[e[1]]]
+        for heap in (self.under, self.over, self.under_atan, self.over_atan):
+            heapq.heapify(heap)
+    
+    @staticmethod
+    def _top(heap, assigned):
+        while heap and heap[0][2] in assigned:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+    
+    def best(self, is_atan, assigned):
+        """המועמד הזמין עם המאזן הנמוך ביותר, או None"""
+        # אם כולם עברו מכסה שבועית - המכסה לא נאכפת (כמו קודם)
+        if self._top(self.under, assigned) is not None:
+            heap = self.under_atan if is_atan else self.under
+        else:
+            heap = self.over_atan if is_atan else self.over
+        return self._top(heap, assigned)
+
+def auto_assign(dates, shi_df, req_df, balance, weekly_limit=DEFAULT_WEEKLY_LIMIT,
+                strict_hours=True, cancelled=frozenset(), date_dim=None, slots=None):
+    """שיבוץ אוטומטי עם כללים מתקדמים"""
+    temp_schedule, temp_assigned = {}, {d: set() for d in dates}
+    atan_col = get_atan_column(req_df)
+    if slots is None:
+        slots = build_slot_table(dates, shi_df, date_dim)
+    
+    # אינדקס מועמדים - נבנה פעם אחת לכל הריצה, עם מזהי עובדים מספריים
+    emp_codes, emp_names = pd.factorize(req_df['שם'], use_na_sentinel=False)
+    emp_codes = emp_codes.tolist()
+    emp_names = list(emp_names)
+    candidate_index = build_candidate_index(req_df)
+    req_hours = get_hours_keys(req_df)
+    atan_ok = (req_df[atan_col] == 'כן').tolist() if atan_col else None
+    all_ok = [True] * len(req_df)
+    
+    # מאזן רץ ושיבוצים שבועיים לפי מזהה עובד
+    running_balance = [balance.get(name, 0) for name in emp_names]
+    weekly_assignments = {}
+    
+    # המשבצות לפי סדר התאריכים - מאגרים ושיבוצי היום מתאפסים בכל תאריך חדש
+    current_date = None
+    for shift_key, date_str, week_key, station, shift_type, is_atan, shift_hours in slot_records(
+            slots, ['key', 'date', 'week', 'station', 'shift', 'atan', 'hours']):
+        if date_str != current_date:
+            current_date, assigned_codes, pools = date_str, set(), {}
+        if shift_key in cancelled:
+            continue
+        
+        # מאגר מועמדים (לפי תאריך, משמרת, תחנה ושעות)
+        hours_filter = shift_hours if strict_hours and shift_hours != -1 else None
+        pool_key = (shift_type, station, hours_filter)
+        pool = pools.get(pool_key)
+        if pool is None:
+            rows = candidate_index.get((date_str, shift_type, station), ())
+            rows = [r for r in rows if emp_codes[r] not in assigned_codes]
+            
+            # בדיקת שעות (אם מופעל)
+            if hours_filter is not None:
+                matching_hours = {emp_codes[r] for r in rows if req_hours[r] == hours_filter}
+                rows = [r for r in rows if emp_codes[r] in matching_hours]
+                
+            # בדיקת מכסה שבועית
+            under_limit = {
+                emp_codes[r] for r in rows
+                if weekly_assignments.get((emp_codes[r], week_key), 0) < weekly_limit
+            }
+                
+            entries = [(running_balance[emp_codes[r]], r, emp_codes[r]) for r in rows]
+            pool = pools[pool_key] = CandidatePool(entries, under_limit, atan_ok or all_ok)
+                
+        # שיבוץ - מאזן נמוך ביותר, שוויון לפי סדר הקובץ (בדיקת אט"ן לפי סוג תקן)
+        top = pool.best(is_atan and atan_ok is not None, assigned_codes)
+        if top is not None:
+            best_code = top[2]
+            best = emp_names[best_code]
+            temp_schedule[shift_key] = best
+            temp_assigned[date_str].add(best)
+            assigned_codes.add(best_code)
+            running_balance[best_code] += 1
+            
+            # עדכן ספירה שבועית
+            if week_key:
+                weekly_assignments[(best_code, week_key)] = weekly_assignments.get((best_code, week_key), 0) + 1
+    
+    return temp_schedule, temp_assigned
+
+def optimal_assign(dates, shi_df, req_df, balance, weekly_limit=DEFAULT_WEEKLY_LIMIT,
+                   strict_hours=True, cancelled=frozenset(), time_budget=10.0, date_dim=None, slots=None):
+    """שיבוץ גלובלי - מקסימום כיסוי ואז מאזן אחיד (זרימה ברשת)
+
+    רשת: משבצת -> (עובד, יום) [קיבולת 1] -> (עובד, שבוע) [מכסה שבועית].
+    מתחילים משיבוץ חמדני (המשבצות המוגבלות ביותר קודם), משלימים משבצות
+    ריקות במסלולי הגדלה עד לכיסוי מקסימלי, ואז מעבירים משמרות מעובדים עם
+    מאזן גבוה לעובדים עם מאזן נמוך כל עוד הפער גדול מ-1.
+    שני השלבים נעצרים כשנגמר time_budget (בשניות).
+    """
+    deadline = time.perf_counter() + time_budget
+    atan_col = get_atan_column(req_df)
+    if slots is None:
+        slots = build_slot_table(dates, shi_df, date_dim)
+    
+    emp_codes, emp_names = pd.factorize(req_df['שם'], use_na_sentinel=False)
+    emp_codes = emp_codes.tolist()
+    emp_names = list(emp_names)
+    candidate_index = build_candidate_index(req_df)
+    req_hours = get_hours_keys(req_df)
+    atan_ok = (req_df[atan_col] == 'כן').tolist() if atan_col else None
+    
+    # משבצות ומועמדים כשירים לכל משבצת
+    slot_keys, slot_day, slot_week, eligible = [], [], [], []
+    day_ids = {date_str: day for day, date_str in enumerate(dates)}
+    week_ids = {}
+    for shift_key, date_str, week_key, station, shift_type, is_atan, shift_hours in slot_records(
+            slots, ['key', 'date', 'week', 'station', 'shift', 'atan', 'hours']):
+        if shift_key in cancelled:
+            continue
+        rows = candidate_index.get((date_str, shift_type, station), ())
+        if strict_hours and shift_hours != -1:
+            matching_hours = {emp_codes[r] for r in rows if req_hours[r] == shift_hours}
+            rows = [r for r in rows if emp_codes[r] in matching_hours]
+        if is_atan and atan_ok is not None:
+            rows = [r for r in rows if atan_ok[r]]
+        slot_keys.append(shift_key)
+        slot_day.append(day_ids[date_str])
+        slot_week.append(week_ids.setdefault(week_key, len(week_ids)))
+        eligible.append(list(dict.fromkeys(emp_codes[r] for r in rows)))
+    
+    total = [balance.get(name, 0) for name in emp_names]
+    assign = [-1] * len(slot_keys)
+    day_owner = {}      # (עובד, יום) -> משבצת
+    week_slots = {}     # (עובד, שבוע) -> משבצות
+    
+    def take(s, e):
+        assign[s] = e
+        day_owner[(e, slot_day[s])] = s
+        week_slots.setdefault((e, slot_week[s]), set()).add(s)
+        total[e] += 1
+    
+    def release(s):
+        e = assign[s]
+        assign[s] = -1
+        del day_owner[(e, slot_day[s])]
+        week_slots[(e, slot_week[s])].discard(s)
+        total[e] -= 1
+    
+    def week_count(e, w):
+        return len(week_slots.get((e, w), ()))
+    
+    # שלב 0: חמדני - המשבצות עם הכי מעט מועמדים קודם
+    for s in sorted(range(len(slot_keys)), key=lambda s: len(eligible[s])):
+        best = None
+        for e in eligible[s]:
+            if (e, slot_day[s]) in day_owner or week_count(e, slot_week[s]) >= weekly_limit:
+                continue
+            if best is None or total[e] < total[best]:
+                best = e
+        if best is not None:
+            take(s, best)
+    
+    def find_path(roots, is_end):
+        """BFS ברשת השארית: משבצת שצריכה עובד -> עובד פנוי בסוף המסלול"""
+        parent = {s: None for s in roots}
+        seen_days, seen_weeks = set(), set()
+        queue = list(roots)
+        for s in queue:
+            day, week = slot_day[s], slot_week[s]
+            for e in eligible[s]:
+                if e == assign[s] or (e, day) in seen_days:
+                    continue
+                seen_days.add((e, day))
+                owner = day_owner.get((e, day))
+                if owner is not None:
+                    # העובד כבר משובץ באותו יום - המשבצת השנייה מחפשת מחליף
+                    if owner not in parent:
+                        parent[owner] = (s, e)
+                        queue.append(owner)
+                    continue
+                if week_count(e, week) < weekly_limit and is_end(e):
+                    moves = [(s, e)]
+                    while parent[s] is not None:
+                        s, e = parent[s]
+                        moves.append((s, e))
+                    return moves
+                if (e, week) in seen_weeks:
+                    continue
+                seen_weeks.add((e, week))
+                # השבוע מלא - משמרת אחרת של העובד באותו שבוע מחפשת מחליף
+                for other in week_slots.get((e, week), ()):
+                    if other not in parent:
+                        parent[other] = (s, e)
+                        queue.append(other)
+        return None
+    
+    def apply(moves):
+        for s, _ in moves:
+            if assign[s] != -1:
+                release(s)
+        for s, e in moves:
+            take(s, e)
+    
+    # שלב 1: מקסימום כיסוי - מסלול הגדלה לכל משבצת ריקה
+    for s in range(len(slot_keys)):
+        if time.perf_counter() > deadline:
+            logger.warning("optimal_assign: time budget reached during coverage phase")
+            break
+        if assign[s] == -1 and eligible[s]:
+            moves = find_path([s], lambda e: True)
+            if moves:
+                apply(moves)
+    
+    # שלב 2: איזון - העברת משמרת מעובד עם מאזן גבוה לעובד עם מאזן נמוך ב-2 לפחות
+    improved = True
+    while improved and time.perf_counter() <= deadline:
+        improved = False
+        busy = {}
+        for s, e in enumerate(assign):
+            if e != -1:
+                busy.setdefault(e, []).append(s)
+        for e in sorted(busy, key=lambda e: -total[e]):
+            if time.perf_counter() > deadline:
+                break
+            limit = total[e] - 2
+            moves = find_path([s for s in busy[e] if assign[s] == e], lambda x: total[x] <= limit)
+            if moves:
+                apply(moves)
+                improved = True
+    
+    temp_schedule, temp_assigned = {}, {d: set() for d in dates}
+    for s, e in enumerate(assign):
+        if e != -1:
+            temp_schedule[slot_keys[s]] = emp_names[e]
+            temp_assigned[dates[slot_day[s]]].add(emp_names[e])
+    return temp_schedule, temp_assigned
+
+def repair_assign(date_str, dates, shi_df, req_df, schedule, balance, weekly_limit=DEFAULT_WEEKLY_LIMIT,
+                  strict_hours=True, cancelled=frozenset(), date_dim=None, exclude=(), slots=None):
+    """השלמה מקומית אחרי ביטול/מחיקה - רק משבצות ריקות בשבוע של date_str
+
+    שאר השיבוצים נשארים קבועים: עובד שכבר עובד ביום לא ישובץ שוב, והמכסה
+    השבועית נספרת מהשיבוצים הקיימים. exclude - זוגות (משבצת, עובד) אסורים,
+    למשל העובד שהוסר הרגע מהמשבצת. מחזיר רק את השיבוצים החדשים.
+    """
+    if slots is None:
+        slots = build_slot_table(dates, shi_df, date_dim)
+    day_weeks = slots.loc[slots['date'] == date_str, 'week']
+    if day_weeks.empty:
+        return {}
+    week_slots = slots[slots['week'] == day_weeks.iloc[0]]
+    week_dates = list(dict.fromkeys(week_slots['date'].tolist()))
+    
+    exclude = set(exclude)
+    
+    # בקשות השבוע בלבד
+    week_req = req_df[req_df['תאריך מבוקש'].isin(week_dates)]
+    candidate_index = build_candidate_index(week_req)
+    names = week_req['שם'].to_numpy(dtype=object).tolist()
+    req_hours = get_hours_keys(week_req)
+    atan_col = get_atan_column(week_req)
+    atan_ok = (week_req[atan_col] == 'כן').tolist() if atan_col else None
+    
+    # מצב קיים: מי עובד בכל יום ומכסה שבועית
+    working = {d: set() for d in week_dates}
+    weekly_count = {}
+    empty_slots = []
+    for shift_key, d, station, shift_type, is_atan, shift_hours in slot_records(
+            week_slots, ['key', 'date', 'station', 'shift', 'atan', 'hours']):
+        employee = schedule.get(shift_key)
+        if employee is not None:
+            working[d].add(employee)
+            weekly_count[employee] = weekly_count.get(employee, 0) + 1
+        elif shift_key not in cancelled:
+            empty_slots.append((d, shift_key, station, shift_type, is_atan, shift_hours))
+    
+    # אותם כללים כמו auto_assign: שעות לפי עובד, ומעבר למכסה רק כשאין מועמד מתחתיה
+    all_ok = [True] * len(week_req)
+    running_balance = dict(balance)
+    filled = {}
+    for d, shift_key, station, shift_type, is_atan, shift_hours in empty_slots:
+        rows = [
+            r for r in candidate_index.get((d, shift_type, station), ())
+            if names[r] not in working[d] and (shift_key, names[r]) not in exclude
+        ]
+        if strict_hours and shift_hours != -1:
+            matching_hours = {names[r] for r in rows if req_hours[r] == shift_hours}
+            rows = [r for r in rows if names[r] in matching_hours]
+        under_limit = {names[r] for r in rows if weekly_count.get(names[r], 0) < weekly_limit}
+        entries = [(running_balance.get(names[r], 0), r, names[r]) for r in rows]
+        top = CandidatePool(entries, under_limit, atan_ok or all_ok).best(is_atan and atan_ok is not None, working[d])
+        
+        if top is not None:
+            best = top[2]
+            filled[shift_key] = best
+            working[d].add(best)
+            weekly_count[best] = weekly_count.get(best, 0) + 1
+            running_balance[best] = running_balance.get(best, 0) + 1
+    
+    return filled
+
+def read_csv_file(source):
+    """קריאת CSV עם טיפול בגרשיים ו-BOM + ניקוי רווחים משמות עמודות"""
+    df = pd.read_csv(source, encoding='utf-8-sig', quotechar='"', doublequote=True)
+    df.columns = df.columns.str.strip()
+    return df
+
+def prepare_inputs(req_df, shi_df):
+    """נרמול שני הקבצים במקום - מחזיר (תיקונים שבוצעו, שגיאות ולידציה)"""
+    corrections = []
+    
+    # נקה ותקן עמודות שעות (רווחים, שעות הפוכות) + דקות מספריות למנוע
+    for df_name, df in [('בקשות', req_df), ('משמרות', shi_df)]:
+        corrections.extend(normalize_hours(df, df_name))
+    
+    # שמות, תאריכים, משמרות, תחנות, שעות ואט"ן - קודים במקום מחרוזות
+    atan_col = get_atan_column(req_df)
+    intern_columns(req_df, CATEGORY_COLUMNS + get_time_columns(req_df) + ([atan_col] if atan_col else []))
+    
+    return corrections, validate_dataframes(req_df, shi_df)
+
+def ingest(req_source, shi_source):
+    """קליטה מלאה: קריאה, נרמול, ולידציה, עמודת אט"ן וטבלת תאריכים
+
+    מחזיר dict עם req_df, shi_df, corrections, errors, atan_col, date_dim, dates, weeks, slots
+    ו-day_shift_index - (תאריך, משמרת) -> מיקומי בקשות, לשיבוץ ידני.
+    כשיש שגיאות ולידציה - רק הקבצים, התיקונים והשגיאות מלאים.
+    """
+    req_df = read_csv_file(req_source)
+    shi_df = read_csv_file(shi_source)
+    corrections, errors = prepare_inputs(req_df, shi_df)
+    result = {
+        'req_df': req_df, 'shi_df': shi_df, 'corrections': corrections, 'errors': errors,
+        'atan_col': None, 'date_dim': None, 'dates': [], 'weeks': {}, 'slots': None,
+        'day_shift_index': {},
+    }
+    if not errors:
+        result['atan_col'] = get_atan_column(req_df)
+        result['date_dim'] = build_date_dimension(req_df['תאריך מבוקש'])
+        result['dates'] = sort_dates(result['date_dim'])
+        result['weeks'] = group_dates_by_week(result['dates'], result['date_dim'])
+        result['slots'] = build_slot_table(result['dates'], shi_df, result['date_dim'])
+        result['day_shift_index'] = build_candidate_index(req_df, CANDIDATE_KEY_COLUMNS[:2])
+    return result
+
+def build_export_df(schedule, cancelled, req_df, slots, balance):
+    """טבלת ייצוא מלאה - משובצות + מבוטלות, ממוינת לפי תאריך, תחנה ומשמרת
+
+    תאריך, יום, תחנה, משמרת וסוג תקן נלקחים מטבלת המשבצות; מפתח שלא
+    מופיע בטבלה (למשל מתבנית קודמת) לא נכלל. שעות ותחנה מבוקשת - מהבקשה
+    הראשונה של העובד לאותו תאריך ומשמרת, ב-merge אחד ולא סינון לכל שיבוץ.
+    """
+    slot_index = pd.Index(slots['key'])
+    
+    # משובצות - שורת משבצת + עובד, לפי סדר השיבוץ
+    positions = slot_index.get_indexer(list(schedule))
+    known = positions >= 0
+    assigned = slots.iloc[positions[known]][['date', 'day', 'station', 'shift', 'kind', 'date_value']]
+    assigned = assigned.astype({col: object for col in ['date', 'day', 'station', 'shift', 'kind']})
+    assigned['שם עובד'] = np.array(list(schedule.values()), dtype=object)[known]
+    
+    # בקשה ראשונה לכל (עובד, תאריך, משמרת)
+    time_cols = [c for c in req_df.columns if 'שע' in c or 'זמן' in c]
+    request_cols = ['שם', 'תאריך מבוקש', 'משמרת'] + time_cols[:1] + (['תחנה'] if 'תחנה' in req_df.columns else [])
+    requests = req_df[request_cols].drop_duplicates(['שם', 'תאריך מבוקש', 'משמרת'], keep='first')
+    requests = requests.astype(object).rename(columns={
+        'שם': 'שם עובד', 'תאריך מבוקש': 'date', 'משמרת': 'shift', 'תחנה': 'requested_station'
+    })
+    if time_cols:
+        requests = requests.rename(columns={time_cols[0]: 'requested_hours'})
+    assigned = assigned.merge(requests, on=['שם עובד', 'date', 'shift'], how='left', indicator=True)
+    matched = (assigned['_merge'] == 'both').to_numpy()
+    
+    hours = assigned['requested_hours'] if time_cols else pd.Series(np.nan, index=assigned.index)
+    assigned['שעות'] = np.where(hours.notna(), hours.astype(str), '')
+    if 'requested_station' in assigned.columns:
+        assigned['תחנה מבוקשת'] = np.where(matched, assigned['requested_station'], assigned['station'])
+    else:
+        assigned['תחנה מבוקשת'] = assigned['station']
+    names = assigned['שם עובד'].tolist()
+    assigned['מאזן משמרות'] = [balance.get(name, 0) for name in names]
+    assigned['סטטוס'] = 'משובץ'
+    
+    # מבוטלות - בלי עובד
+    positions = slot_index.get_indexer(list(cancelled))
+    cancelled_rows = slots.iloc[positions[positions >= 0]][['date', 'day', 'station', 'shift', 'kind', 'date_value']]
+    cancelled_rows = cancelled_rows.astype({col: object for col in ['date', 'day', 'station', 'shift', 'kind']})
+    cancelled_rows = cancelled_rows.assign(**{
+        'שעות': '', 'תחנה מבוקשת': '', 'שם עובד': '', 'מאזן משמרות': 0, 'סטטוס': 'מבוטל'
+    })
+    
+    export_df = pd.concat([assigned, cancelled_rows], ignore_index=True).rename(columns={
+        'date': 'תאריך', 'day': 'יום', 'station': 'תחנה משובצת', 'shift': 'משמרת', 'kind': 'סוג תקן'
+    })
+    if export_df.empty:
+        return pd.DataFrame(columns=EXPORT_COLUMNS)
+    
+    # Convert balance column to numeric to avoid Arrow serialization issues
+    export_df['מאזן משמרות'] = pd.to_numeric(export_df['מאזן משמרות'], errors='coerce').fillna(0).astype(int)
+    export_df = export_df.sort_values(['date_value', 'תחנה משובצת', 'משמרת'])
+    return export_df[EXPORT_COLUMNS]
+
+def write_xlsx(export_df, target, sheet_name='שיבוץ'):
+    """גיליון Excel בשורות - xlsxwriter במצב constant_memory
+
+    כל שורה נכתבת לקובץ זמני ומשתחררת, כך שהזיכרון לא גדל עם מספר השורות.
+    """
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False,
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.right_to_left()
+    worksheet.write_row(0, 0, export_df.columns.tolist())
+    values = export_df.astype(object).where(export_df.notna(), None)
+    for row, record in enumerate(zip(*(values[col].tolist() for col in values.columns)), start=1):
+        worksheet.write_row(row, 0, record)
+    workbook.close()
+
+def write_export(export_df, fmt, target=None):
+    """כתיבת טבלת הייצוא - csv (UTF-8 עם BOM), parquet או xlsx
+
+    target - נתיב או קובץ בינארי; בלי target מוחזרים ה-bytes.
+    parquet נכתב עמודתית (pyarrow), xlsx בשורות (write_xlsx).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"פורמט ייצוא לא נתמך: {fmt}")
+    if fmt == 'xlsx' and not XLSX_AVAILABLE:
+        raise ValueError("ייצוא xlsx דורש את החבילה xlsxwriter")
+    out = io.BytesIO() if target is None else target
+    if fmt == 'csv':
+        export_df.to_csv(out, index=False, encoding='utf-8-sig')
+    elif fmt == 'parquet':
+        export_df.to_parquet(out, index=False)
+    else:
+        write_xlsx(export_df, out)
+    return out.getvalue() if target is None else None
+
+def build_missing_report(dates, shi_df, req_df, schedule, cancelled, assigned_today, date_dim=None, slots=None):
+    """דוח חוסרים - משבצת לא משובצת ולא מבוטלת + סיבה"""
+    if slots is None:
+        slots = build_slot_table(dates, shi_df, date_dim)
+    candidate_index = build_candidate_index(req_df)
+    names = req_df['שם'].to_numpy(dtype=object).tolist()
+    
+    missing_shifts = []
+    for shift_key, date_str, day_name, station, shift_type, shift_kind in slot_records(
+            slots, ['key', 'date', 'day', 'station', 'shift', 'kind']):
+        if shift_key in schedule or shift_key in cancelled:
+            continue
+        
+        already_working = assigned_today.get(date_str, set())
+        potential = candidate_index.get((date_str, shift_type, station), ())
+        if not potential:
+            reason = "אין בקשות"
+        elif all(names[r] in already_working for r in potential):
+            reason = f"כל המבקשים משובצים ({len(potential)})"
+        else:
+            reason = "לא ידוע"
+            
+        missing_shifts.append({
+            'תאריך': date_str,
+            'יום': day_name,
+            'תחנה': station,
+            'משמרת': shift_type,
+            'סוג תקן': shift_kind,
+            'סיבה': reason
+        })
+    
+    return pd.DataFrame(missing_shifts, columns=MISSING_COLUMNS)
+
+def load_balance_csv(path):
+    """מאזן מצטבר מקובץ ייצוא עובדים (שם, סה"כ משמרות)"""
+    df = read_csv_file(path)
+    return dict(zip(df['שם'], pd.to_numeric(df['סה"כ משמרות'], errors='coerce').fillna(0).astype(int)))
+
+def main(argv=None):
+    """שיבוץ משורת הפקודה: שני קבצי CSV -> קובץ שיבוץ CSV"""
+    parser = argparse.ArgumentParser(description="שיבוץ משמרות ללא ממשק")
+    parser.add_argument('requests', help="קובץ בקשות עובדים (CSV)")
+    parser.add_argument('shifts', help="קובץ תבנית משמרות (CSV)")
+    parser.add_argument('-o', '--output', default='schedule.csv', help="קובץ שיבוץ לכתיבה (.csv / .parquet / .xlsx)")
+    parser.add_argument('--missing', help="קובץ דוח חוסרים לכתיבה (אופציונלי)")
+    parser.add_argument('--balance', help="מאזן מצטבר - קובץ ייצוא עובדים (אופציונלי)")
+    parser.add_argument('--weekly-limit', type=int, default=DEFAULT_WEEKLY_LIMIT, help="מכסה שבועית")
+    parser.add_argument('--no-strict-hours', action='store_true', help="התעלמות משעות")
+    parser.add_argument('--mode', choices=['greedy', 'optimal'], default='greedy', help="מצב שיבוץ")
+    parser.add_argument('--time-budget', type=float, default=10.0, help="מגבלת זמן למצב אופטימלי (שניות)")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    inputs = ingest(args.requests, args.shifts)
+    for correction in inputs['corrections']:
+        logger.info(correction)
+    if inputs['errors']:
+        for e in inputs['errors']:
+            logger.error(e)
+        return 1
+    
+    req_df, shi_df = inputs['req_df'], inputs['shi_df']
+    dates, slots = inputs['dates'], inputs['slots']
+    balance = load_balance_csv(args.balance) if args.balance else {}
+    settings = dict(weekly_limit=args.weekly_limit, strict_hours=not args.no_strict_hours, slots=slots)
+    
+    if args.mode == 'optimal':
+        schedule, assigned_today = optimal_assign(
+            dates, shi_df, req_df, balance, time_budget=args.time_budget, **settings
+        )
+    else:
+        schedule, assigned_today = auto_assign(dates, shi_df, req_df, balance, **settings)
+    
+    # מאזן כולל את השיבוץ החדש - כמו בממשק
+    for employee in schedule.values():
+        balance[employee] = balance.get(employee, 0) + 1
+    
+    export_df = build_export_df(schedule, set(), req_df, slots, balance)
+    output_format = os.path.splitext(args.output)[1].lstrip('.').lower()
+    write_export(export_df, output_format if output_format in EXPORT_FORMATS else 'csv', args.output)
+    logger.info(f"✅ שובצו {len(schedule)} משמרות מתוך {len(shi_df) * len(dates)} -> {args.output}")
+    
+    if args.missing:
+        missing_df = build_missing_report(dates, shi_df, req_df, schedule, set(), assigned_today, slots=slots)
+        missing_df.to_csv(args.missing, index=False, encoding='utf-8-sig')
+        logger.info(f"📋 {len(missing_df)} משמרות חסרות -> {args.missing}")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,459 @@
+"""
+שמירה ל-Database - ללא Streamlit
+
+ממשק אחיד (Storage) לקריאת מאזן, הוספה למאזן, כתיבת משמרות וייצוא,
+עם שני מימושים:
+- FirestoreStorage - מקבל לקוח Firestore או תחליף מקומי עם אותו ממשק
+  (ראו benchmarks/local_firestore.py)
+- SQLiteStorage - קובץ מקומי עם טבלאות מאונדקסות, לאתרים בלי ענן
+"""
+
+import abc
+import csv
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from google.api_core.exceptions import AlreadyExists
+    from google.cloud.firestore import Increment
+except ImportError:
+    # בלי firebase-admin - אותו ממשק לתחליף המקומי (benchmarks/local_firestore.py)
+    class AlreadyExists(Exception):
+        """create על מסמך שכבר קיים - ה-batch כולו לא מוחל"""
+    
+    class Increment:
+        """תוספת אטומית לשדה מספרי, מחושבת בשרת"""
+        
+        def __init__(self, value):
+            self.value = value
+
+FIRESTORE_BATCH_LIMIT = 500  # מקסימום פעולות ב-batch / get_all אחד
+EMPLOYEES_COLLECTION = 'employees'
+SHIFTS_COLLECTION = 'shifts'
+SAVES_COLLECTION = 'saves'  # סימון שמירות שכבר הוחלו (אידמפוטנטיות)
+EXPORT_PAGE_SIZE = 1000  # מסמכים לכל בקשה בייצוא
+# שדה במסמך -> (כותרת בקובץ, ערך כשהשדה חסר)
+SHIFT_EXPORT_FIELDS = {
+    'date': ('תאריך', ''), 'station': ('תחנה', ''), 'shift_type': ('משמרת', ''),
+    'employee': ('עובד', ''), 'status': ('סטטוס', ''), 'timestamp': ('זמן שמירה', ''),
+}
+EMPLOYEE_EXPORT_FIELDS = {'name': ('שם', ''), 'total_shifts': ('סה"כ משמרות', 0)}
+SHIFT_FIELDS = ['date', 'date_iso', 'station', 'shift_type', 'employee', 'status', 'timestamp']
+SHIFT_WRITE_WORKERS = 8  # batches של משמרות שנכתבים במקביל לכל היותר
+STATUS_ASSIGNED, STATUS_CANCELLED = 'משובץ', 'מבוטל'
+SYNC_CLOCK_MARGIN = 60.0  # שניות חפיפה בשאילתת שינויים - מכסה הפרשי שעון בין שרתים
+SQLITE_VARIABLE_LIMIT = 900  # פרמטרים לשאילתה אחת (ברירת המחדל הישנה של SQLite היא 999)
+
+def chunked(items, size=FIRESTORE_BATCH_LIMIT):
+    """חלוקה לקבוצות של עד size פריטים"""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def count_by_employee(schedule):
+    """מספר משמרות לכל עובד בשיבוץ"""
+    return Counter(schedule.values())
+
+def shift_doc_id(date_iso, station, shift_type, idx):
+    """מזהה מסמך קבוע למשבצת - שמירה חוזרת דורסת ולא משכפלת"""
+    return '_'.join(str(part).replace('/', '-') for part in (date_iso, station, shift_type, idx))
+
+def build_shift_records(schedule, cancelled, slot_info, timestamp):
+    """רשומה לכל משבצת משובצת ומבוטלת: {מזהה מסמך: dict עם SHIFT_FIELDS}
+    
+    slot_info: מפתח משבצת -> (תאריך, YYYY-MM-DD, תחנה, משמרת, שורה בתבנית),
+    מטבלת המשבצות של המנוע. מפתח שאין לו פרטים לא נכתב.
+    """
+    records = {}
+    slots = [(key, employee, STATUS_ASSIGNED) for key, employee in schedule.items()]
+    slots += [(key, '', STATUS_CANCELLED) for key in cancelled]
+    for shift_key, employee, status in slots:
+        if shift_key not in slot_info:
+            continue
+        date_str, date_iso, station, shift_type, idx = slot_info[shift_key]
+        records[shift_doc_id(date_iso, station, shift_type, idx)] = {
+            'date': date_str, 'date_iso': date_iso, 'station': station, 'shift_type': shift_type,
+            'employee': employee, 'status': status, 'timestamp': timestamp,
+        }
+    return records
+
+def build_shift_deletions(schedule, cancelled, slot_info):
+    """מזהי מסמכים של משבצות ב-slot_info שאינן משובצות ואינן מבוטלות
+    
+    מחיקת שיבוץ או שחזור ביטול משאירים ב-shifts מסמך ישן ('משובץ' / 'מבוטל');
+    המזהים האלה נמחקים באותה שמירה, כך שה-Database תואם את השיבוץ באופק.
+    """
+    return [
+        shift_doc_id(date_iso, station, shift_type, idx)
+        for shift_key, (_, date_iso, station, shift_type, idx) in slot_info.items()
+        if shift_key not in schedule and shift_key not in cancelled
+    ]
+
+def save_employee_totals(db, employee_count, batch_size=FIRESTORE_BATCH_LIMIT, save_token=None):
+    """הוספת משמרות הסשן למאזן המצטבר (total_shifts) של כל עובד
+    
+    לכל קבוצה של עד batch_size עובדים: commit אחד עם Increment לכל עובד -
+    התוספת מחושבת בשרת, כך ששני מתכננים ששומרים במקביל לא דורסים זה את זה -
+    ואחריו קריאה מרובת מסמכים אחת (get_all) של הסכומים. מחזיר
+    {שם: (משמרות חדשות, סה"כ אחרי השמירה)}.
+    
+    עם save_token כל קבוצה נכתבת יחד עם create של מסמך סימון ב-saves באותו
+    batch; אם הסימון כבר קיים ה-create נכשל וה-batch כולו לא מוחל - כך ניסיון
+    חוזר אחרי תקלה לא סופר משמרות פעמיים.
+    """
+    employees_ref = db.collection(EMPLOYEES_COLLECTION)
+    written = {}
+    if save_token:
+        batch_size -= 1  # מקום למסמך הסימון
+    
+    for chunk_no, names in enumerate(chunked(sorted(employee_count), batch_size)):
+        refs = [employees_ref.document(name) for name in names]
+        batch = db.batch()
+        updated_at = time.time()
+        for name, doc_ref in zip(names, refs):
+            batch.set(doc_ref, {
+                'name': name, 'total_shifts': Increment(employee_count[name]), 'updated_at': updated_at,
+            }, merge=True)
+        if save_token:
+            marker_ref = db.collection(SAVES_COLLECTION).document(f"{save_token}-{chunk_no}")
+            batch.create(marker_ref, {'token': save_token, 'employees': len(names)})
+        try:
+            batch.commit()
+        except AlreadyExists:
+            pass  # הקבוצה כבר הוחלה בניסיון קודם - רק קוראים סכומים
+        
+        totals = {
+            snapshot.id: (snapshot.to_dict() or {}).get('total_shifts', 0)
+            for snapshot in db.get_all(refs) if snapshot.exists
+        }
+        written.update((name, (employee_count[name], totals.get(name, 0))) for name in names)
+    
+    return written
+
+def iter_documents(query, page_size=EXPORT_PAGE_SIZE):
+    """כל מסמכי השאילתה, דף אחר דף (limit + start_after)
+    
+    בכל רגע מוחזק בזיכרון דף אחד בלבד. השאילתה צריכה order_by יציב.
+    """
+    cursor = None
+    while True:
+        page = query.limit(page_size)
+        if cursor is not None:
+            page = page.start_after(cursor)
+        docs = list(page.stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        cursor = docs[-1]
+
+def shifts_query(db, start=None, end=None):
+    """משמרות שמורות, רק שדות הייצוא ו-date_iso, לפי תאריך
+    
+    הסינון והמיון בשרת לפי date_iso (YYYY-MM-DD); בלי טווח - לפי מזהה
+    המסמך, שמתחיל ב-date_iso, כך שגם מסמכים ישנים בלי השדה נכללים.
+    date_iso נבחר גם כשאינו בקובץ - הסמן של הדף הבא (start_after) לוקח
+    ממנו את ערך המיון.
+    """
+    query = db.collection(SHIFTS_COLLECTION)
+    if start or end:
+        if start:
+            query = query.where('date_iso', '>=', start.isoformat())
+        if end:
+            query = query.where('date_iso', '<=', end.isoformat())
+        query = query.order_by('date_iso')
+    else:
+        query = query.order_by('__name__')
+    return query.select([*SHIFT_EXPORT_FIELDS, 'date_iso'])
+
+def balance_changes_query(db, since):
+    """עובדים שעודכנו אחרי since (updated_at, שניות epoch), רק שם/מאזן/זמן"""
+    query = db.collection(EMPLOYEES_COLLECTION).where('updated_at', '>', since).order_by('updated_at')
+    return query.select(['name', 'total_shifts', 'updated_at'])
+
+def employees_query(db):
+    """עובדים לפי מאזן יורד, רק שם ומאזן
+
+    Firestore משמיט ממיון לפי שדה מסמכים שאין בהם את השדה - אותם מחזיר
+    all_employees_query במעבר שני.
+    """
+    query = db.collection(EMPLOYEES_COLLECTION).order_by('total_shifts', direction='DESCENDING')
+    return query.select(list(EMPLOYEE_EXPORT_FIELDS))
+
+def all_employees_query(db):
+    """כל העובדים לפי מזהה המסמך, רק שם ומאזן"""
+    return db.collection(EMPLOYEES_COLLECTION).order_by('__name__').select(list(EMPLOYEE_EXPORT_FIELDS))
+
+def write_csv(records, fields, out, on_progress=None, progress_every=EXPORT_PAGE_SIZE):
+    """כתיבת רשומות (dict) כ-CSV שורה אחר שורה - מחזיר את מספר השורות
+    
+    out: קובץ טקסט פתוח (לאקסל - encoding='utf-8-sig').
+    on_progress(מספר שורות) נקרא כל progress_every שורות ובסוף.
+    """
+    writer = csv.writer(out)
+    writer.writerow([header for header, _ in fields.values()])
+    rows = 0
+    for data in records:
+        writer.writerow([data.get(field, default) for field, (_, default) in fields.items()])
+        rows += 1
+        if on_progress and rows % progress_every == 0:
+            on_progress(rows)
+    if on_progress:
+        on_progress(rows)
+    return rows
+
+class Storage(abc.ABC):
+    """ממשק אחסון - מאזן עובדים והיסטוריית משמרות"""
+    
+    name = ""
+    
+    @abc.abstractmethod
+    def read_balance(self):
+        """{שם: total_shifts} לכל העובדים"""
+    
+    @abc.abstractmethod
+    def read_balance_since(self, since):
+        """עובדים שהמאזן שלהם עודכן אחרי since - מחזיר ({שם: total_shifts}, סימן מים חדש)
+        
+        since=None - קריאה מלאה. סימן המים הוא updated_at המקסימלי שנראה.
+        """
+    
+    @abc.abstractmethod
+    def increment_balance(self, employee_count, save_token=None):
+        """הוספה ל-total_shifts - מחזיר {שם: (משמרות חדשות, סה"כ שנכתב)}
+        
+        save_token: מזהה גרסת השיבוץ; שמירה חוזרת עם אותו מזהה לא מוסיפה שוב.
+        """
+    
+    @abc.abstractmethod
+    def write_shifts(self, records, deleted=()):
+        """כתיבה/דריסה של רשומות משמרת {מזהה: dict עם SHIFT_FIELDS} - מחזיר כמות
+        
+        המזהים קבועים (shift_doc_id), כך ששמירה חוזרת דורסת את אותם מסמכים.
+        deleted - מזהי משבצות שהתרוקנו (build_shift_deletions), נמחקים באותה
+        כתיבה; מזהה שאין לו מסמך מתעלמים ממנו.
+        """
+    
+    @abc.abstractmethod
+    def export_shifts(self, start=None, end=None):
+        """רשומות משמרת (dict) בטווח תאריכים, לפי תאריך - בזרימה"""
+    
+    @abc.abstractmethod
+    def export_employees(self):
+        """רשומות עובד (dict) לפי מאזן יורד, כאיטרטור"""
+
+class FirestoreStorage(Storage):
+    """אוספי employees / shifts ב-Firestore"""
+    
+    name = "Firestore"
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def read_balance(self):
+        return self.read_balance_since(None)[0]
+    
+    def read_balance_since(self, since):
+        if since is None:
+            docs = self.db.collection(EMPLOYEES_COLLECTION).stream()
+        else:
+            docs = iter_documents(balance_changes_query(self.db, since))
+        balance, watermark = {}, since
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('name'):
+                balance[data['name']] = data.get('total_shifts', 0)
+            if data.get('updated_at') is not None:
+                watermark = max(watermark or 0, data['updated_at'])
+        return balance, watermark
+    
+    def increment_balance(self, employee_count, save_token=None):
+        return save_employee_totals(self.db, employee_count, save_token=save_token)
+    
+    def write_shifts(self, records, deleted=(), workers=SHIFT_WRITE_WORKERS):
+        """batches של עד 500 פעולות, עד workers במקביל (ויסות מול מגבלות הכתיבה)"""
+        shifts_ref = self.db.collection(SHIFTS_COLLECTION)
+        operations = [*records.items(), *((doc_id, None) for doc_id in deleted)]
+        
+        def commit(chunk):
+            batch = self.db.batch()
+            for doc_id, data in chunk:
+                if data is None:
+                    batch.delete(shifts_ref.document(doc_id))
+                else:
+                    batch.set(shifts_ref.document(doc_id), data)
+            batch.commit()
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(commit, chunked(operations)))
+        return len(records)
+    
+    def export_shifts(self, start=None, end=None):
+        return (doc.to_dict() or {} for doc in iter_documents(shifts_query(self.db, start, end)))
+    
+    def export_employees(self):
+        """שני מעברים בזרימה: לפי מאזן יורד, ואז עובדים בלי total_shifts (מאזן 0)"""
+        for doc in iter_documents(employees_query(self.db)):
+            yield doc.to_dict() or {}
+        for doc in iter_documents(all_employees_query(self.db)):
+            data = doc.to_dict() or {}
+            if 'total_shifts' not in data:
+                yield data
+
+class SQLiteStorage(Storage):
+    """קובץ SQLite מקומי - upsert בכמויות ואינדקסים לשאילתות הייצוא
+    
+    חיבור חדש לכל פעולה (זול ב-SQLite) כדי שסשנים במקביל לא יחלקו חיבור;
+    WAL מאפשר קריאה בזמן כתיבה.
+    """
+    
+    name = "SQLite"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS employees (
+            name TEXT PRIMARY KEY,
+            total_shifts INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS employees_total ON employees (total_shifts DESC);
+        CREATE TABLE IF NOT EXISTS shifts (
+            id TEXT PRIMARY KEY,
+            date TEXT, date_iso TEXT, station TEXT, shift_type TEXT,
+            employee TEXT, status TEXT, timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS shifts_date ON shifts (date_iso, station);
+        CREATE TABLE IF NOT EXISTS saves (token TEXT PRIMARY KEY);
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+            # קבצים מגרסה קודמת - בלי updated_at
+            if 'updated_at' not in {row[1] for row in conn.execute('PRAGMA table_info(employees)')}:
+                conn.execute('ALTER TABLE employees ADD COLUMN updated_at REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS employees_updated ON employees (updated_at)')
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+    
+    def read_balance(self):
+        return self.read_balance_since(None)[0]
+    
+    def read_balance_since(self, since):
+        conn = self._connect()
+        try:
+            if since is None:
+                rows = conn.execute('SELECT name, total_shifts, updated_at FROM employees').fetchall()
+            else:
+                rows = conn.execute('SELECT name, total_shifts, updated_at FROM employees '
+                                    'WHERE updated_at > ?', (since,)).fetchall()
+        finally:
+            conn.close()
+        stamps = [updated_at for _, _, updated_at in rows if updated_at is not None]
+        return {name: total for name, total, _ in rows}, max(stamps, default=since)
+    
+    def increment_balance(self, employee_count, save_token=None):
+        conn = self._connect()
+        try:
+            with conn:
+                # הטוקן והתוספות באותה טרנזקציה - שמירה חוזרת רק קוראת סכומים
+                applied = save_token and conn.execute(
+                    'INSERT OR IGNORE INTO saves (token) VALUES (?)', (save_token,)).rowcount == 0
+                updated_at = time.time()
+                conn.executemany(
+                    'INSERT INTO employees (name, total_shifts, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET total_shifts = total_shifts + excluded.total_shifts, '
+                    'updated_at = excluded.updated_at',
+                    [] if applied else [(name, count, updated_at) for name, count in employee_count.items()])
+                totals = {}
+                for names in chunked(employee_count, SQLITE_VARIABLE_LIMIT):
+                    placeholders = ','.join('?' * len(names))
+                    totals.update(conn.execute(
+                        f'SELECT name, total_shifts FROM employees WHERE name IN ({placeholders})', names))
+        finally:
+            conn.close()
+        return {name: (count, totals[name]) for name, count in employee_count.items()}
+    
+    def write_shifts(self, records, deleted=()):
+        columns = ['id'] + SHIFT_FIELDS
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('DELETE FROM shifts WHERE id = ?', [(doc_id,) for doc_id in deleted])
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO shifts ({", ".join(columns)}) '
+                    f'VALUES ({", ".join("?" * len(columns))})',
+                    [[doc_id] + [data.get(field) for field in SHIFT_FIELDS] for doc_id, data in records.items()])
+        finally:
+            conn.close()
+        return len(records)
+    
+    def _stream(self, sql, params=()):
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_PAGE_SIZE)
+                if not rows:
+                    return
+                for row in rows:
+                    yield {key: row[key] for key in row.keys() if row[key] is not None}
+        finally:
+            conn.close()
+    
+    def export_shifts(self, start=None, end=None):
+        conditions, params = [], []
+        if start:
+            conditions.append('date_iso >= ?')
+            params.append(start.isoformat())
+        if end:
+            conditions.append('date_iso <= ?')
+            params.append(end.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._stream(f'SELECT * FROM shifts {where} ORDER BY date_iso, id', params)
+    
+    def export_employees(self):
+        return self._stream('SELECT name, total_shifts FROM employees ORDER BY total_shifts DESC, name')
+
+class BalanceSync:
+    """מאזן מצטבר בזיכרון, מסונכרן בשינויים בלבד (סימן מים על updated_at)
+    
+    טעינה מלאה פעם אחת; אחר כך, לכל היותר פעם ב-interval שניות, נקראים רק
+    עובדים שעודכנו מאז הסנכרון האחרון (בחפיפה של SYNC_CLOCK_MARGIN - המיזוג
+    הוא דריסת סכומים, ולכן קריאה כפולה לא מזיקה) וממוזגים למפה.
+    """
+    
+    def __init__(self, store, interval=30.0):
+        self.store = store
+        self.interval = interval
+        self._balance = {}
+        self._watermark = None
+        self._loaded = False
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+    
+    def invalidate(self):
+        """הסנכרון הבא ירוץ מיד (למשל אחרי שמירה)"""
+        self._next_sync = 0.0
+    
+    def snapshot(self):
+        """עותק של המאזן - מסנכרן קודם אם עבר interval"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_sync:
+                if not self._loaded:
+                    changes, watermark = self.store.read_balance_since(None)
+                    self._balance, self._loaded = changes, True
+                else:
+                    since = self._watermark - SYNC_CLOCK_MARGIN if self._watermark is not None else 0
+                    changes, watermark = self.store.read_balance_since(since)
+                    self._balance.update(changes)
+                if watermark is not None:
+                    self._watermark = max(self._watermark or watermark, watermark)
+                self._next_sync = now + self.interval
+            return dict(self._balance)